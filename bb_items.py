@@ -1,12 +1,25 @@
 import pygame as pg
+import numpy as np
 from pathlib import Path
-import os
 
 from header import *
-from utils import get_icon, pointOnLine
+from fonts import get_font, render_text
+from utils import draw_line, launch
+from linestore import segment_distance2, simplify
+from icons import request_icon
 from widgets import *
 
+# colors shared by every item (they are only ever replaced, never changed in place)
+PALETTE = [pg.Color(*color) for color in COLOR_PAL]
+EDITING = pg.Color(*EDITING_COLOR)
+
 class App:
+    # boards hold many items, so they have no per-instance __dict__
+    # (uid is given by the BlackBoard)
+    __slots__ = ("path", "name", "old_name", "x", "y", "old_x", "old_y", "offset_x", "offset_y",
+                 "keep", "dragging", "options_opened", "renaming", "dirty", "drawn_rect",
+                 "color_idx", "text_color", "icon", "options_menu", "rect", "text_surface", "uid")
+
     def __init__(self, path, x, y, color, name):
         # path to app (file) and name of the app
         self.path = Path(path)
@@ -21,15 +34,18 @@ class App:
         self.dragging = False
         self.options_opened = False
         self.renaming = False
+        # class variables for damage tracking (area covered when last drawn)
+        self.dirty = True
+        self.drawn_rect = None
         # class variables for various font, color, and special effects
-        self.font = pg.font.Font(APP_FONT, APP_FONTSIZE)
         self.color_idx = color
         self.text_color = pg.Color(*COLOR_PAL[color])
-        self.icon = get_icon(path, "large")
-        # instances that make up an App instance
-        self.options_menu = AppOptionsMenu(self)
+        # placeholder until the icon is loaded in the background (see set_icon)
+        self.icon = request_icon(path, "large", self)
+        # instances that make up an App instance (options menu is built when first opened)
+        self.options_menu = None
         self.rect = pg.Rect(x, y, 32, 32)
-        self.text_surface = self.font.render(self.name, True, self.text_color)
+        self.text_surface = render_text(APP_FONT, APP_FONTSIZE, self.name, self.text_color)
 
     def handle_event(self, event):
         interacted = False
@@ -53,8 +69,7 @@ class App:
                     self.renaming = False
                 # {BACKSPACE} removes 1 char, or 1 word if {CTRL} is held down
                 elif event.key == pg.K_BACKSPACE:
-                    keystates = pg.key.get_pressed()
-                    if keystates[pg.K_LCTRL]:
+                    if event.mod & pg.KMOD_LCTRL:
                         i = self.name.rstrip().rfind(" ")
                         self.name = self.name[:i+1] if i >= 0 else ''
                     else:
@@ -67,7 +82,7 @@ class App:
                 # else typing a char
                 else:
                     self.name += event.unicode
-            self.text_surface = self.font.render(self.name, True, self.text_color)
+            self.text_surface = render_text(APP_FONT, APP_FONTSIZE, self.name, self.text_color)
         elif event.type == pg.MOUSEBUTTONDOWN:
             # start dragging
             if event.button == 1 and self.rect.collidepoint(event.pos):
@@ -80,6 +95,8 @@ class App:
             # right click to open options
             if event.button == 3 and self.rect.collidepoint(event.pos):
                 interacted = True
+                if self.options_menu is None:
+                    self.options_menu = AppOptionsMenu(self)
                 self.options_menu.setpos(*event.pos)
                 self.options_opened = True
         elif event.type == pg.MOUSEMOTION:
@@ -96,47 +113,107 @@ class App:
                 self.dragging = False
                 # launch app if clicked (and not dragged)
                 if self.x == self.old_x and self.y == self.old_y:
-                    os.startfile(self.path)
+                    launch(self.path)
+        if interacted:
+            self.dirty = True
         return interacted
 
     def update(self):
         # update position of rect
         self.rect.x, self.rect.y = self.x, self.y
 
-    def draw(self, screen):
+    def set_icon(self, icon):
+        # called from the main loop once the real icon is loaded
+        self.icon = icon
+        self.dirty = True
+
+    def captures(self):
+        # holds the pointer: every pointer event goes to it and only to it
+        return self.options_opened or self.dragging
+
+    def editing(self):
+        # holds the keyboard focus
+        return self.renaming
+
+    def engaged(self):
+        # an engaged item sees events that aren't on top of it
+        return self.captures() or self.editing()
+
+    def blur(self):
+        # another item took the keyboard focus, keep the name as typed so far
+        self.old_name = self.name
+        self.text_color = pg.Color(*COLOR_PAL[self.color_idx])
+        self.renaming = False
+        self.text_surface = render_text(APP_FONT, APP_FONTSIZE, self.name, self.text_color)
+        self.dirty = True
+
+    def record(self):
+        # what is saved of this app (see savefile)
+        return ("App", str(self.path), self.x, self.y, self.color_idx, self.name)
+
+    def get_bounds(self):
+        # area covered by the icon, the name below it, the hitbox and the options menu
+        text_w = self.text_surface.get_width()
+        x_offset = (text_w - 32)//2 if text_w > 32 else 0
+        bounds = self.icon.get_rect(topleft=(self.x, self.y))
+        bounds.union_ip(self.text_surface.get_rect(topleft=(self.x - x_offset, self.y + 30)))
+        bounds.union_ip(self.rect)
+        if self.options_opened:
+            bounds.union_ip(self.options_menu.get_bounds())
+        return bounds
+
+    def draw(self, screen, view):
         # draw the name centered just below the icon
         text_w = self.text_surface.get_width()
         x_offset = (text_w - 32)//2 if text_w > 32 else 0
-        screen.blit(self.text_surface, (self.x - x_offset, self.y + 30))
+        text = view.text(self.text_surface, lambda size: render_text(APP_FONT, size, self.name, self.text_color), APP_FONTSIZE)
+        screen.blit(text, view.to_screen((self.x - x_offset, self.y + 30)))
         # draw the app icon
-        screen.blit(self.icon, (self.x, self.y))
+        screen.blit(view.image(self.icon), view.to_screen((self.x, self.y)))
         # draw options menu if opened
         if self.options_opened:
-            self.options_menu.draw(screen)
+            self.options_menu.draw(screen, view)
 
 
 class ChalkText():
+    __slots__ = ("text", "old_text", "fontsize", "color_idx", "color", "keep", "active", "dragging",
+                 "options_opened", "dirty", "drawn_rect", "x", "y", "old_x", "old_y", "offset_x",
+                 "offset_y", "options_menu", "text_size", "rect", "uid")
+
     def __init__(self, text, x, y, fontsize, color, new):
         self.text = text
         self.old_text = text
         # class variables for font and color
         self.fontsize = fontsize
-        self.font = pg.font.Font(CHALK_FONT, self.fontsize)
         self.color_idx = color
-        self.color = pg.Color(*EDITING_COLOR) if new else pg.Color(*COLOR_PAL[color])
+        self.color = EDITING if new else PALETTE[color]
         # class variables for state of this ChalkText
         self.keep = True
         self.active = True if new else False
         self.dragging = False
         self.options_opened = False
+        # class variables for damage tracking (area covered when last drawn)
+        self.dirty = True
+        self.drawn_rect = None
         # class variables for position and movement
         self.x, self.y = x, y
         self.old_x, self.old_y = x, y
         self.offset_x, self.offset_y = 0, 0
-        # instances that make up a ChalkText instance
-        self.options_menu = ChalkTextOptionsMenu(self)
-        self.text_surface = self.font.render(text, True, self.color)
-        self.rect = pg.Rect(self.x, self.y, self.text_surface.get_width() + 10, self.fontsize)
+        # instances that make up a ChalkText instance (options menu is built when first opened),
+        # the text is only measured here, it is rendered when drawn (see text_surface)
+        self.options_menu = None
+        self.text_size = get_font(CHALK_FONT, self.fontsize).size(text)
+        self.rect = pg.Rect(self.x, self.y, self.text_size[0] + 10, self.fontsize)
+
+    @property
+    def text_surface(self):
+        # rendered text, shared through the text cache rather than kept by every
+        # ChalkText (most of a big board is out of view)
+        return render_text(CHALK_FONT, self.fontsize, self.text, self.color)
+
+    def measure(self):
+        # size of the text once rendered, call after changing text or fontsize
+        self.text_size = get_font(CHALK_FONT, self.fontsize).size(self.text)
 
     def handle_event(self, event):
         interacted = False
@@ -151,12 +228,11 @@ class ChalkText():
             if event.key == pg.K_RETURN:
                 self.old_text = self.text
                 self.active = False
-                self.color = pg.Color(*COLOR_PAL[self.color_idx])
+                self.color = PALETTE[self.color_idx]
                 self.keep = False if self.text == '' else True
             # {BACKSPACE} removes 1 char, or 1 word if {CTRL} is held down
             elif event.key == pg.K_BACKSPACE:
-                keystates = pg.key.get_pressed()
-                if keystates[pg.K_LCTRL]:
+                if event.mod & pg.KMOD_LCTRL:
                     i = self.text.rstrip().rfind(" ")
                     self.text = self.text[:i+1] if i >= 0 else ''
                 else:
@@ -165,12 +241,12 @@ class ChalkText():
             elif event.key == pg.K_ESCAPE:
                 self.text = self.old_text
                 self.active = False
-                self.color = pg.Color(*COLOR_PAL[self.color_idx])
+                self.color = PALETTE[self.color_idx]
                 self.keep = False if self.text == '' else True
             # typing char
             else:
                 self.text += event.unicode
-            self.text_surface = self.font.render(self.text, True, self.color)
+            self.measure()
         elif event.type == pg.MOUSEBUTTONDOWN:
             # start dragging
             if event.button == 1 and self.rect.collidepoint(event.pos):
@@ -183,6 +259,8 @@ class ChalkText():
             # right click to open the options menu for this ChalkText
             if event.button == 3 and self.rect.collidepoint(event.pos):
                 interacted = True
+                if self.options_menu is None:
+                    self.options_menu = ChalkTextOptionsMenu(self)
                 self.options_menu.setpos(*event.pos)
                 self.options_opened = True
         elif event.type == pg.MOUSEMOTION:
@@ -200,44 +278,124 @@ class ChalkText():
                 # activate if clicked (and not dropped)
                 if self.x == self.old_x and self.y == self.old_y:
                     self.active = True
-                    self.color = pg.Color(*EDITING_COLOR)
+                    self.color = EDITING
             # left click off ChalkText de-activates it
             elif event.button == 1 and not self.rect.collidepoint(event.pos):
+                if self.active:
+                    self.dirty = True
                 self.active = False
-                self.color = pg.Color(*COLOR_PAL[self.color_idx])
-            self.text_surface = self.font.render(self.text, True, self.color)
+                self.color = PALETTE[self.color_idx]
+        if interacted:
+            self.dirty = True
         return interacted
 
     def update(self):
         self.rect.x, self.rect.y = self.x, self.y
-        self.rect.width = self.text_surface.get_width() + 10
+        self.rect.width = self.text_size[0] + 10
         self.rect.height = self.fontsize 
 
-    def draw(self, screen):
-        screen.blit(self.text_surface, (self.x, self.y))
+    def captures(self):
+        # holds the pointer: every pointer event goes to it and only to it
+        return self.options_opened or self.dragging
+
+    def editing(self):
+        # holds the keyboard focus
+        return self.active
+
+    def engaged(self):
+        # an engaged item sees events that aren't on top of it
+        return self.captures() or self.editing()
+
+    def blur(self):
+        # another item took the keyboard focus, same as clicking off this one
+        self.active = False
+        self.color = PALETTE[self.color_idx]
+        self.dirty = True
+
+    def record(self):
+        # what is saved of this text (see savefile), nothing while it is empty
+        if self.text == '':
+            return None
+        return ("ChalkText", self.text, self.x, self.y, self.fontsize, self.color_idx)
+
+    def get_bounds(self):
+        # area covered by the text, the hitbox and the options menu
+        bounds = pg.Rect((self.x, self.y), self.text_size)
+        bounds.union_ip(self.rect)
+        if self.options_opened:
+            bounds.union_ip(self.options_menu.get_bounds())
+        return bounds
+
+    def draw(self, screen, view):
+        text = view.text(self.text_surface, lambda size: render_text(CHALK_FONT, size, self.text, self.color), self.fontsize)
+        screen.blit(text, view.to_screen((self.x, self.y)))
         # draw options menu if opened
         if self.options_opened:
-            self.options_menu.draw(screen)
+            self.options_menu.draw(screen, view)
 
 
 class ChalkLine:
-    def __init__(self, s_x, s_y, e_x, e_y, width, color, drawn):
-        # class variable for line position
-        self.start_pos = (s_x, s_y)
-        self.end_pos = (e_x, e_y)
-        # class variable for color and various states
-        self.color_idx = color
-        self.color = pg.Color(*COLOR_PAL[color]) if drawn else pg.Color(*EDITING_COLOR)
+    __slots__ = ("lines", "slot", "drawn", "keep", "dragging", "start_offset", "end_offset",
+                 "options_menu", "options_opened", "dirty", "drawn_rect", "uid")
+
+    def __init__(self, s_x, s_y, e_x, e_y, width, color, drawn, lines):
+        # class variable for line position, width and color, kept only in the
+        # shared LineStore (slot) that also answers hit-tests for all lines at once
+        self.lines = lines
+        self.slot = lines.add((s_x, s_y), (e_x, e_y), width, color)
+        # class variable for various states (drawn in the editing color until placed)
         self.drawn = drawn
         self.keep = True
-        self.width = width
         # class variables used for drag and drop
         self.dragging = False
         self.start_offset = (0, 0)
         self.end_offset = (0, 0)
-        # class variables for options menu
-        self.options_menu = ChalkLineOptionsMenu(self)
+        # class variables for options menu (built the first time it is opened)
+        self.options_menu = None
         self.options_opened = False
+        # class variables for damage tracking (area covered when last drawn)
+        self.dirty = True
+        self.drawn_rect = None
+
+    @property
+    def start_pos(self):
+        return self.lines.get_start(self.slot)
+
+    @start_pos.setter
+    def start_pos(self, pos):
+        self.lines.set_start(self.slot, pos)
+
+    @property
+    def end_pos(self):
+        return self.lines.get_end(self.slot)
+
+    @end_pos.setter
+    def end_pos(self, pos):
+        self.lines.set_end(self.slot, pos)
+
+    @property
+    def width(self):
+        return self.lines.get_width(self.slot)
+
+    @width.setter
+    def width(self, width):
+        self.lines.set_width(self.slot, width)
+
+    @property
+    def color_idx(self):
+        return self.lines.get_color(self.slot)
+
+    @color_idx.setter
+    def color_idx(self, color):
+        self.lines.set_color(self.slot, color)
+
+    @property
+    def color(self):
+        return PALETTE[self.color_idx] if self.drawn else EDITING
+
+    def hit(self, pos):
+        # is pos on this line (within half its width plus some tolerance)
+        return self.lines.hit(self.slot, pos, LINE_HIT_TOLERANCE)
 
     def handle_event(self, event):
         interacted = False
@@ -249,12 +407,14 @@ class ChalkLine:
                 self.options_menu.handle_event(event)
             elif event.type == pg.MOUSEBUTTONDOWN:
                 # right click to open options menu
-                if event.button == 3 and pointOnLine(event.pos, self.start_pos, self.end_pos):
+                if event.button == 3 and self.hit(event.pos):
                     interacted = True
+                    if self.options_menu is None:
+                        self.options_menu = ChalkLineOptionsMenu(self)
                     self.options_menu.setpos(*event.pos)
                     self.options_opened = True
                 # left click to start dragging
-                elif event.button == 1 and pointOnLine(event.pos, self.start_pos, self.end_pos):
+                elif event.button == 1 and self.hit(event.pos):
                     interacted = True
                     self.dragging = True
                     mouse_x, mouse_y = event.pos
@@ -262,6 +422,7 @@ class ChalkLine:
                     self.end_offset = (self.end_pos[0] - mouse_x, self.end_pos[1] - mouse_y)
             # user continues dragging
             elif event.type == pg.MOUSEMOTION and self.dragging:
+                self.dirty = True
                 mouse_x, mouse_y = event.pos
                 self.start_pos = (mouse_x + self.start_offset[0], mouse_y + self.start_offset[1])
                 self.end_pos = (mouse_x + self.end_offset[0], mouse_y + self.end_offset[1])
@@ -284,15 +445,226 @@ class ChalkLine:
                     self.keep = False
                 else:
                     self.drawn = True
-                    self.color = pg.Color(*COLOR_PAL[self.color_idx])
+        if interacted:
+            self.dirty = True
+        return interacted
+
+    def update(self):
+        # nothing to update
+        pass
+
+    def captures(self):
+        # holds the pointer: every pointer event goes to it and only to it
+        return self.options_opened or self.dragging or not self.drawn
+
+    def editing(self):
+        # never takes the keyboard focus
+        return False
+
+    def engaged(self):
+        # an engaged item sees events that aren't on top of it
+        return self.captures()
+
+    def record(self):
+        # what is saved of this line (see savefile)
+        return ("ChalkLine", self.start_pos[0], self.start_pos[1], self.end_pos[0], self.end_pos[1],
+                self.width, self.color_idx)
+
+    def get_bounds(self):
+        # bounding box of the stroke and the options menu, padded by the
+        # width and the click tolerance
+        left, right = sorted((self.start_pos[0], self.end_pos[0]))
+        top, bottom = sorted((self.start_pos[1], self.end_pos[1]))
+        pad = self.width + 2*LINE_HIT_TOLERANCE + 2
+        bounds = pg.Rect(left, top, right - left + 1, bottom - top + 1).inflate(pad, pad)
+        if self.options_opened:
+            bounds.union_ip(self.options_menu.get_bounds())
+        return bounds
+
+    def draw(self, screen, view):
+        draw_line(screen, self.color, view.to_screen(self.start_pos), view.to_screen(self.end_pos), view.size(self.width))
+        # draw options menu if opened
+        if self.options_opened:
+            self.options_menu.draw(screen, view)
+
+
+class ChalkStroke:
+    __slots__ = ("x", "y", "points", "width", "color_idx", "drawn", "keep", "dragging",
+                 "offset_x", "offset_y", "options_menu", "options_opened", "dirty", "drawn_rect", "uid",
+                 "laid_out")
+
+    def __init__(self, x, y, points, width, color, drawn):
+        # freehand stroke: x, y is where it starts and points the polyline as a
+        # flat (x0, y0, x1, y1, ...) tuple of offsets from there (moving the
+        # stroke only moves x, y); while being drawn, points is a list of the
+        # mouse samples, simplified once the stroke is done
+        self.x, self.y = x, y
+        self.points = tuple(points) if drawn else list(points)
+        self.width = width
+        # class variable for color and various states
+        self.color_idx = color
+        self.drawn = drawn
+        self.keep = True
+        # class variables used for drag and drop
+        self.dragging = False
+        self.offset_x, self.offset_y = 0, 0
+        # class variables for options menu (built the first time it is opened)
+        self.options_menu = None
+        self.options_opened = False
+        # class variables for damage tracking (area covered when last drawn)
+        self.dirty = True
+        self.drawn_rect = None
+        # ((points, width, zoom), area) of the last layout, see area()
+        self.laid_out = None
+
+    @property
+    def color(self):
+        return PALETTE[self.color_idx] if self.drawn else EDITING
+
+    def hit(self, pos):
+        # is pos on the stroke (within half its width plus some tolerance)
+        xs = np.array(self.points[0::2], dtype=float)
+        ys = np.array(self.points[1::2], dtype=float)
+        if len(xs) == 1:
+            xs, ys = np.repeat(xs, 2), np.repeat(ys, 2)
+        d2 = segment_distance2(xs[:-1], ys[:-1], xs[1:], ys[1:], pos[0] - self.x, pos[1] - self.y)
+        reach = self.width / 2 + LINE_HIT_TOLERANCE
+        return bool((d2 <= reach*reach).any())
+
+    def handle_event(self, event):
+        interacted = False
+        # if this ChalkStroke is already drawn
+        if self.drawn:
+            if self.options_opened:
+                # options menu is open, handle events there
+                interacted = True
+                self.options_menu.handle_event(event)
+            elif event.type == pg.MOUSEBUTTONDOWN:
+                # right click to open options menu
+                if event.button == 3 and self.hit(event.pos):
+                    interacted = True
+                    if self.options_menu is None:
+                        self.options_menu = ChalkStrokeOptionsMenu(self)
+                    self.options_menu.setpos(*event.pos)
+                    self.options_opened = True
+                # left click to start dragging
+                elif event.button == 1 and self.hit(event.pos):
+                    interacted = True
+                    self.dragging = True
+                    mouse_x, mouse_y = event.pos
+                    self.offset_x = self.x - mouse_x
+                    self.offset_y = self.y - mouse_y
+            # user continues dragging
+            elif event.type == pg.MOUSEMOTION and self.dragging:
+                self.dirty = True
+                mouse_x, mouse_y = event.pos
+                self.x = mouse_x + self.offset_x
+                self.y = mouse_y + self.offset_y
+            # user drops
+            elif event.type == pg.MOUSEBUTTONUP and self.dragging:
+                interacted = True
+                self.dragging = False
+        # if this ChalkStroke is still being drawn
+        else:
+            interacted = True
+            # following the mouse, a sample for every position it moves to
+            if event.type == pg.MOUSEMOTION:
+                dx, dy = event.pos[0] - self.x, event.pos[1] - self.y
+                if (dx, dy) != tuple(self.points[-2:]) and max(abs(dx), abs(dy)) <= STROKE_REACH:
+                    self.points += (dx, dy)
+            # releasing mouse click to finish the stroke
+            elif event.type == pg.MOUSEBUTTONUP and event.button == 1:
+                # if the stroke covers next to nothing, nothing is drawn
+                xs, ys = self.points[0::2], self.points[1::2]
+                if max(xs) - min(xs) < 5 and max(ys) - min(ys) < 5:
+                    interacted = False
+                    self.keep = False
+                else:
+                    points = simplify(list(zip(xs, ys)), STROKE_TOLERANCE)
+                    self.points = tuple(v for point in points for v in point)
+                    self.drawn = True
+        if interacted:
+            self.dirty = True
         return interacted
 
     def update(self):
         # nothing to update
         pass
 
-    def draw(self, screen):
-        pg.draw.line(screen, self.color, self.start_pos, self.end_pos, self.width)
+    def captures(self):
+        # holds the pointer: every pointer event goes to it and only to it
+        return self.options_opened or self.dragging or not self.drawn
+
+    def editing(self):
+        # never takes the keyboard focus
+        return False
+
+    def engaged(self):
+        # an engaged item sees events that aren't on top of it
+        return self.captures()
+
+    def record(self):
+        # what is saved of this stroke (see savefile)
+        return ("ChalkStroke", self.x, self.y, tuple(self.points), self.width, self.color_idx)
+
+    def get_bounds(self):
+        # bounding box of the stroke and the options menu, padded by the
+        # width and the click tolerance
+        xs, ys = self.points[0::2], self.points[1::2]
+        left, top = min(xs), min(ys)
+        pad = self.width + 2*LINE_HIT_TOLERANCE + 2
+        bounds = pg.Rect(self.x + left, self.y + top, max(xs) - left + 1, max(ys) - top + 1).inflate(pad, pad)
+        if self.options_opened:
+            bounds.union_ip(self.options_menu.get_bounds())
+        return bounds
+
+    def layout(self, zoom):
+        # the polyline in window pixels (relative to x, y) at zoom, its width,
+        # and the area (relative to x, y) it covers once drawn
+        width = max(1, round(self.width * zoom))
+        points = [(round(x * zoom), round(y * zoom)) for x, y in zip(self.points[0::2], self.points[1::2])]
+        r = width // 2 + 1
+        left = min(x for x, y in points) - r
+        top = min(y for x, y in points) - r
+        right = max(x for x, y in points) + r + 1
+        bottom = max(y for x, y in points) + r + 1
+        return points, width, pg.Rect(left, top, right - left, bottom - top)
+
+    def area(self, zoom):
+        # layout(zoom)'s area, worked out again only once the points, width or
+        # zoom changed (finished strokes only, a stroke being drawn grows its
+        # points in place)
+        key = (self.points, self.width, zoom)
+        if self.laid_out is None or self.laid_out[0] != key:
+            self.laid_out = (key, self.layout(zoom)[2])
+        return self.laid_out[1]
+
+    def render(self, zoom):
+        # the stroke on a surface of its own: what pg.draw.lines touches depends
+        # on the clip, a blit doesn't, so repainting part of it (dirty
+        # rectangles) still lines up with the rest
+        points, width, area = self.layout(zoom)
+        surface = pg.Surface(area.size, pg.SRCALPHA)
+        points = [(x - area.x, y - area.y) for x, y in points]
+        if len(points) > 1:
+            pg.draw.lines(surface, self.color, False, points, width)
+        # round the joints and ends of thick strokes
+        if width > 2 or len(points) == 1:
+            for point in points:
+                pg.draw.circle(surface, self.color, point, width / 2)
+        return surface
+
+    def draw(self, screen, view):
+        # finished strokes are drawn once per zoom level (and color and width)
+        if self.drawn:
+            key = (self.points, self.width, self.color_idx, view.zoom)
+            surface = view.cache.get(key, lambda: self.render(view.zoom))
+            area = self.area(view.zoom)
+        else:
+            surface = self.render(view.zoom)
+            area = self.layout(view.zoom)[2]
+        x, y = view.to_screen((self.x, self.y))
+        screen.blit(surface, (x + area.x, y + area.y))
         # draw options menu if opened
         if self.options_opened:
-            self.options_menu.draw(screen)
+            self.options_menu.draw(screen, view)
@@ -0,0 +1,330 @@
+import os, sys, json, time, random, tempfile, shutil, platform, argparse, hashlib
+from threading import Thread
+
+# headless: SDL's dummy video driver, no window and no sound
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import pygame as pg
+
+from header import *
+import bb_items
+import savefile
+import utils
+from blackboard import BlackBoard
+from journal import Journal
+from eventtrace import read_trace
+from wakeup import WAKEUP, wake, wait_events
+
+# synthetic boards: one item per SPREAD x SPREAD px of board on average (so
+# the window shows about as many items whatever the board size), made of
+# texts, lines, strokes and apps in these proportions
+SPREAD = 100
+MIX = (("ChalkText", 0.4), ("ChalkLine", 0.3), ("ChalkStroke", 0.2), ("App", 0.1))
+# events in each stream, frames drawn per frame benchmark, items of the
+# board benchmarked (and thrown away) first
+EVENTS = 500
+FRAMES = 30
+WARMUP = 500
+# wake() calls timed (one every WAKEUP_GAP s) and seconds of idle waiting
+# timed by the event loop benchmark
+WAKEUPS = 50
+WAKEUP_GAP = 0.01
+IDLE_SECONDS = 1
+
+def make_board(n, seed=0):
+    # (uid, record) of a board of n items, top-most first
+    rnd = random.Random(seed)
+    side = max(int((n * SPREAD * SPREAD) ** 0.5), WIDTH)
+    kinds = rnd.choices([kind for kind, share in MIX], [share for kind, share in MIX], k=n)
+    board = []
+    for uid, kind in enumerate(kinds):
+        x, y, color = rnd.randrange(side), rnd.randrange(side), rnd.randrange(NUM_COLORS)
+        if kind == "ChalkText":
+            record = ("ChalkText", "note %d" % uid, x, y, CHALK_FONTSIZE, color)
+        elif kind == "ChalkLine":
+            record = ("ChalkLine", x, y, x + rnd.randint(-80, 80), y + rnd.randint(-80, 80), 6, color)
+        elif kind == "ChalkStroke":
+            points = [0, 0]
+            for i in range(rnd.randint(4, 24)):
+                points += (points[-2] + rnd.randint(-12, 12), points[-1] + rnd.randint(-12, 12))
+            record = ("ChalkStroke", x, y, tuple(points), 6, color)
+        else:
+            record = ("App", "bench/app%d.txt" % uid, x, y, color, "app %d" % uid)
+        board.append((uid, record))
+    return board
+
+def summary(times):
+    # median and 99th percentile (ms) of timings (s)
+    times = sorted(times)
+    return {"median_ms": round(times[len(times) // 2] * 1000, 4),
+            "p99_ms": round(times[min(len(times) - 1, len(times) * 99 // 100)] * 1000, 4),
+            "count": len(times)}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def event(kind, **attrs):
+    return pg.event.Event(kind, attrs)
+
+def texts(bb):
+    # window positions of a corner of the texts in the window, top-most
+    # first, where no other item covers them and no app is under them (clicks
+    # bring items to the top, an app that came up would be dragged instead),
+    # off the search bar (clicking it would start the search worker)
+    found = []
+    for item in sorted(bb.grid.query_rect(bb.view.rect_to_world(bb.window)), key=bb.z.__getitem__):
+        if isinstance(item, bb_items.ChalkText):
+            pos = bb.view.to_screen((item.x + 2, item.y + 2))
+            under = bb.grid.query_point(bb.view.to_world(pos))
+            if (bb.window.collidepoint(pos) and not bb.searchbar.rect.collidepoint(pos) and
+                    min(under, key=bb.z.__getitem__) is item and
+                    not any(isinstance(other, bb_items.App) for other in under)):
+                found.append(pos)
+    return found
+
+def empty_spot(bb, rnd):
+    # a window position with no item (or the search bar) under it
+    while True:
+        pos = (rnd.randrange(WIDTH), rnd.randrange(HEIGHT))
+        if not (bb.grid.query_point(bb.view.to_world(pos)) or bb.searchbar.rect.collidepoint(pos)):
+            return pos
+
+def bench_load(file, screen):
+    # reading the save file, building every item, and (progressively) the
+    # first frame that takes input
+    journal = Journal(file, None, JOURNAL_COMPACT_OPS, JOURNAL_FLUSH_OPS, JOURNAL_FLUSH_INTERVAL)
+    start = time.perf_counter()
+    records = list(journal.load())
+    read = time.perf_counter() - start
+    bb = BlackBoard(records, journal)
+    build = time.perf_counter() - start - read
+    start = time.perf_counter()
+    first = BlackBoard(records, None, True)
+    first.poll()
+    first.draw_dirty(screen)
+    first_frame = time.perf_counter() - start
+    result = {"read_ms": round(read * 1000, 2), "init_ms": round(build * 1000, 2),
+              "first_frame_ms": round(first_frame * 1000, 2)}
+    return bb, journal, result
+
+def bench_draw(bb, screen):
+    # whole window every frame (BlackBoard.draw), the whole window through
+    # the layer (rebaked), and frames of a drag (dirty rectangles)
+    full = []
+    for i in range(FRAMES):
+        screen.fill(BACKGROUND_COLOR)
+        full.append(timed(bb.draw, screen))
+    baked = []
+    for i in range(FRAMES):
+        bb.invalidate()
+        baked.append(timed(bb.draw_dirty, screen))
+    bb.draw_dirty(screen)
+    drag = []
+    x, y = texts(bb)[0]
+    bb.handle_event(event(pg.MOUSEBUTTONDOWN, pos=(x, y), button=1))
+    for i in range(FRAMES):
+        bb.handle_event(event(pg.MOUSEMOTION, pos=(x + i, y + i), rel=(1, 1), buttons=(1, 0, 0)))
+        drag.append(timed(bb.draw_dirty, screen))
+    bb.handle_event(event(pg.MOUSEBUTTONUP, pos=(x + FRAMES - 1, y + FRAMES - 1), button=1))
+    bb.draw_dirty(screen)
+    return {"full": summary(full), "rebake": summary(baked), "drag": summary(drag)}
+
+def bench_events(bb, rnd):
+    # BlackBoard.handle_event for streams of mouse motion (hovering), clicks
+    # (on texts, each activates one), keystrokes (typing into a new text)
+    # and a drag
+    def run(events):
+        return summary([timed(bb.handle_event, e) for e in events])
+    result = {}
+    result["motion"] = run([event(pg.MOUSEMOTION, pos=(rnd.randrange(WIDTH), rnd.randrange(HEIGHT)),
+                                  rel=(1, 1), buttons=(0, 0, 0)) for i in range(EVENTS)])
+    clicks = []
+    spots = texts(bb)
+    for i in range(EVENTS // 2):
+        pos = rnd.choice(spots)
+        clicks += (event(pg.MOUSEBUTTONDOWN, pos=pos, button=1), event(pg.MOUSEBUTTONUP, pos=pos, button=1))
+    result["click"] = run(clicks)
+    spot = empty_spot(bb, rnd)
+    bb.handle_event(event(pg.MOUSEBUTTONDOWN, pos=spot, button=1))
+    bb.handle_event(event(pg.MOUSEBUTTONUP, pos=spot, button=1))
+    result["key"] = run([event(pg.KEYDOWN, key=pg.K_a, unicode="a", mod=0) for i in range(EVENTS)])
+    bb.handle_event(event(pg.KEYDOWN, key=pg.K_RETURN, unicode="\r", mod=0))
+    x, y = texts(bb)[-1]
+    bb.handle_event(event(pg.MOUSEBUTTONDOWN, pos=(x, y), button=1))
+    result["drag"] = run([event(pg.MOUSEMOTION, pos=(x + i % 100, y), rel=(1, 0), buttons=(1, 0, 0))
+                          for i in range(EVENTS)])
+    bb.handle_event(event(pg.MOUSEBUTTONUP, pos=(x + (EVENTS - 1) % 100, y), button=1))
+    return result
+
+def bench_loop():
+    # main.py's event-driven wait: wake() from another thread to wait_events
+    # returning the event, then the CPU used waiting with nothing coming in,
+    # against WAKEUP_TARGET and IDLE_CPU_TARGET (the dummy video driver polls
+    # every 1 ms in its wait, real drivers block)
+    def post():
+        for i in range(WAKEUPS):
+            time.sleep(WAKEUP_GAP)
+            wake()
+    pg.event.clear()
+    poster = Thread(target=post)
+    poster.start()
+    latencies = []
+    while len(latencies) < WAKEUPS:
+        latencies += [time.perf_counter() - event.sent for event in wait_events(None) if event.type == WAKEUP]
+    poster.join()
+    wakeup = summary(latencies)
+    wakeup["target_ms"] = WAKEUP_TARGET * 1000
+    start, cpu = time.perf_counter(), time.process_time()
+    wait_events(IDLE_SECONDS)
+    idle = (time.process_time() - cpu) / (time.perf_counter() - start) * 100
+    return {"wakeup": wakeup, "idle": {"cpu_pct": round(idle, 2), "target_pct": IDLE_CPU_TARGET}}
+
+def bench_save(bb, file):
+    # writing the whole board out (what compacting the journal does)
+    return {"write_ms": round(timed(savefile.write_board, file, bb.saved_items()) * 1000, 2),
+            "bytes": os.path.getsize(file)}
+
+def replay(file, screen):
+    # a recorded session (see eventtrace) played back on a fresh board, as
+    # fast as it goes: handling time of each kind of event (routed like
+    # main.py does), drawing time of each frame, and the board it ended with;
+    # background work (icons, search results) isn't part of it
+    size, board, entries = read_trace(file)
+    if screen.get_size() != size:
+        screen = pg.display.set_mode(size)
+    bb = BlackBoard(board)
+    bb.draw_dirty(screen)
+    costs, frames = {}, []
+    start = time.perf_counter()
+    for ms, event in entries:
+        if event is None:
+            frames.append(timed(bb.draw_dirty, screen))
+            continue
+        if event.type == pg.QUIT:
+            break
+        pg.key.set_mods(getattr(event, "mod", 0))
+        begin = time.perf_counter()
+        if event.type == pg.VIDEORESIZE:
+            screen = pg.display.set_mode((event.w, event.h))
+            bb.searchbar.move(BORDER_WIDTH, event.h-BORDER_WIDTH-CHALK_FONTSIZE)
+            bb.resize((event.w, event.h))
+        elif event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+            bb.expose()
+        elif event.type == pg.KEYDOWN and event.key == pg.K_s and event.mod & pg.KMOD_CTRL:
+            bb.save()
+        # the profiler's key never reaches the board (no overlay here, the
+        # repaint is kept)
+        elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+            bb.expose()
+        else:
+            bb.handle_event(event)
+        costs.setdefault(pg.event.event_name(event.type), []).append(time.perf_counter() - begin)
+    total = time.perf_counter() - start
+    pg.key.set_mods(0)
+    bb.searchbar.service.close()
+    records = [item.record() for item in bb.items]
+    result = {"recorded_s": entries[-1][0] / 1000 if entries else 0, "replay_ms": round(total * 1000, 2),
+              "events": {kind: summary(times) for kind, times in costs.items()}}
+    if frames:
+        result["frames"] = summary(frames)
+    result["board"] = {"items": len(records),
+                       "kinds": {kind: sum(1 for record in records if record and record[0] == kind) for kind in savefile.KINDS},
+                       "digest": hashlib.sha1(repr(records).encode()).hexdigest()}
+    return result
+
+def run(sizes, traces, seed):
+    pg.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    # apps get a fixed tile instead of their icon (no icon lookups, any
+    # platform), and clicking one doesn't open it
+    tile = pg.Surface((32, 32), pg.SRCALPHA)
+    tile.fill(EDITING_COLOR)
+    bb_items.request_icon = lambda path, size, owner: tile
+    utils.launching = False
+    report = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "pygame": pg.version.ver, "sdl": "%d.%d.%d" % pg.get_sdl_version(),
+              "platform": platform.platform(), "seed": seed, "sizes": {}, "traces": {}}
+    report["loop"] = bench_loop()
+    # a small board first, not reported, so loading fonts and filling caches
+    # doesn't count against the first size
+    bench_size(WARMUP, seed, screen)
+    for n in sizes:
+        report["sizes"][str(n)] = bench_size(n, seed, screen)
+        print("%d items done" % n, file=sys.stderr)
+    for file in traces:
+        report["traces"][os.path.basename(file)] = replay(file, screen)
+        print("%s replayed" % file, file=sys.stderr)
+    pg.quit()
+    return report
+
+def bench_size(n, seed, screen):
+    folder = tempfile.mkdtemp(prefix="uibb-bench-")
+    try:
+        file = os.path.join(folder, "save.uibb")
+        savefile.write_board(file, make_board(n, seed))
+        bb, journal, load = bench_load(file, screen)
+        result = {"load": load}
+        result["draw"] = bench_draw(bb, screen)
+        result["events"] = bench_events(bb, random.Random(seed))
+        result["save"] = bench_save(bb, os.path.join(folder, "copy.uibb"))
+        journal.close()
+        return result
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def flatten(tree, prefix=""):
+    # {"sizes.100.load.read_ms": 1.2, ...} out of a report
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif key.endswith("_ms") or key == "bytes":
+            flat[prefix + key] = value
+    return flat
+
+def compare(old, new):
+    # timings of two reports side by side, the ratio above 1 when new is
+    # slower, and the traces that didn't end with the same board
+    for name, trace in new.get("traces", {}).items():
+        before = old.get("traces", {}).get(name)
+        if before is not None and before["board"]["digest"] != trace["board"]["digest"]:
+            print("%s: the board replayed differently (%d items, was %d)" % (
+                name, trace["board"]["items"], before["board"]["items"]))
+    old, new = flatten(old), flatten(new)
+    order = lambda key: [int(part) if part.isdigit() else part for part in key.split(".")]
+    for key in sorted(set(old) & set(new), key=order):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        flag = "  <-- slower" if ratio > 1.1 and new[key] - old[key] > 0.05 else ""
+        print("%-48s %12.3f %12.3f %7.2fx%s" % (key, old[key], new[key], ratio, flag))
+
+
+if __name__ == '__main__':
+    # python bench.py [--sizes 1000,10000] [--replay session.uibt] [--out report.json]
+    #                  [--compare old.json]
+    parser = argparse.ArgumentParser(description="UIbb headless benchmarks")
+    parser.add_argument("--sizes", help="board sizes (items), comma separated (default: 1000,10000,100000,"
+                                        " none if only replaying)")
+    parser.add_argument("--replay", action="append", default=[], metavar="TRACE",
+                        help="replay a trace recorded with main.py --record (can be repeated)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+    sizes = args.sizes or ("" if args.replay else "1000,10000,100000")
+    traces = [os.path.abspath(file) for file in args.replay]
+    out = args.out and os.path.abspath(args.out)
+    old = args.compare and os.path.abspath(args.compare)
+    # fonts and images are found relative to the repository, like main.py
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    report = run([int(n) for n in sizes.split(",") if n], traces, args.seed)
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if old:
+        with open(old) as f:
+            compare(json.load(f), report)
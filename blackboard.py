@@ -1,50 +1,141 @@
 import random as r
+import bisect, time
 
 from bb_items import *
+from utils import merge_rects
+from spatial import SpatialGrid
+from linestore import LineStore
+import icons
+from journal import classify, ADD, DELETE, SWAP, PLACE
+from boardloader import BoardLoader
+from viewport import View
+from profiler import profiler
 
 class BlackBoard():
-    def __init__(self, args_list):
-        # search bar and list of items (App/ChalkText/ChalkLine)
+    def __init__(self, args_list, journal=None, progressive=False):
+        # search bar and list of items (App/ChalkText/ChalkLine/ChalkStroke)
         self.searchbar = SearchBar(BORDER_WIDTH, HEIGHT-BORDER_WIDTH-CHALK_FONTSIZE, "Type here to search")
         self.items = []
-        # class variables for instantiating ChalkText and ChalkLine
+        # class variables for instantiating ChalkText, ChalkLine and ChalkStroke
         self.clicked = False
         self.clicked_x, self.clicked_y = 0, 0
         self.default_color = WHITE
-        # initialize any existing items
-        for args in args_list:
-            if args[0] == "ChalkText":
-                self.add_chalktext(args[1], int(args[2]), int(args[3]), int(args[4]), int(args[5]), False)
-            elif args[0] == "ChalkLine":
-                self.add_chalkline(int(args[1]), int(args[2]), int(args[3]), int(args[4]), int(args[5]), int(args[6]), True)
-            elif args[0] == "App":
-                self.add_app(args[1], int(args[2]), int(args[3]), int(args[4]), args[5].strip())
+        # class variables for the view: items live on a board bigger than the
+        # window, the view is the part of it shown (dragged with the middle
+        # button, zoomed with the wheel)
+        self.view = View()
+        self.panning = False
+        self.window = pg.Rect(0, 0, WIDTH, HEIGHT)
+        # class variables for damage tracking: items changed since the last frame,
+        # regions (of the window) left behind by removed items, and whether to
+        # repaint the whole window
+        self.dirty_items = set()
+        self.damaged = []
+        self.full_redraw = True
+        # class variables for layers: the idle items (and the search bar under
+        # them) are baked into layer, a surface the size of the window that is
+        # only baked again where they change (stale) or everything if rebake;
+        # the items being dragged, typed into or showing a menu (live) are
+        # drawn on top of it wherever the window is repainted
+        self.layer = None
+        self.stale = []
+        self.rebake = True
+        self.live = set()
+        # class variables for hit-testing: a grid over item bounds, the stacking
+        # order of items (smaller is closer to the top, same order as self.items),
+        # and the items that see events not on top of them (engaged): the one
+        # holding the pointer (dragging, drawing or showing a menu) and the one
+        # with the keyboard focus (typing, renaming)
+        self.grid = SpatialGrid(GRID_CELL_SIZE)
+        self.z = {}
+        self.next_z = 0
+        self.engaged = set()
+        self.captor = None
+        self.focus = None
+        # geometry of every ChalkLine, for vectorized hit-testing
+        self.lines = LineStore()
+        # class variables for saving: every change to an item is appended to the
+        # journal (if any) once the item is let go of, saved holds the record
+        # last journaled for each item and uids name items in the journal
+        self.journal = journal
+        self.saved = {}
+        self.next_uid = 0
+        if journal is not None:
+            journal.state = self.saved_items
+        # initialize any existing items ((uid, record) as read by the journal,
+        # any iterable), all of them now or, progressively, a few every frame
+        # from poll() with their place in the stack kept for them
+        self.loader = None
+        # loaded items not painted yet: repainting what each frame's items
+        # cover would redraw the busy parts of the board over and over, so
+        # they are painted together every LOAD_REDRAW_INTERVAL seconds
+        self.unshown = []
+        self.shown_at = time.perf_counter()
+        if progressive:
+            surface = pg.display.get_surface()
+            if surface is not None:
+                self.window = surface.get_rect()
+            self.loader = BoardLoader(args_list, self.view.rect_to_world(self.window))
+            self.next_z = self.loader.count
+            self.next_uid = self.loader.next_uid
+        else:
+            for uid, args in args_list:
+                self.load_record(uid, args)
 
     def handle_event(self, event):
-        # handle event for search bar
+        # moving around the board
+        if self.handle_view_event(event):
+            return
+        # clicks on the search dropdown don't reach the items under it
+        clicked = event.type in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP)
+        covered = clicked and self.searchbar.covers(event.pos)
+        # handle event for search bar (it stays put in the window)
         searched = self.searchbar.handle_event(event)
-        # handle event for all the items on the blackboard
+        # the items see the event where it happened on the board
+        event = self.view.event(event)
+        # handle event for the items it is routed to, top-most first
         interacted = False
         index = -1
-        for i in range(len(self.items)):
-            interacted = self.items[i].handle_event(event)
+        for item in self.route(event, clicked and not covered):
+            interacted = item.handle_event(event)
+            # items can change without claiming the event (e.g. de-activating)
+            if item.dirty:
+                self.dirty_items.add(item)
+                self.reindex(item)
+            elif item.engaged() != (item in self.engaged):
+                self.reindex(item)
+            if interacted or not item.keep:
+                # an item being dragged or drawn was brought to the top already
+                index = 0 if self.items[0] is item else self.items.index(item)
             if interacted:
-                index = i
                 break
+            # a stroke let go of too small to keep doesn't claim the click
+            if not item.keep:
+                self.remove_item(index)
         if interacted and not self.items[index].keep:
-            del self.items[index]
+            self.remove_item(index)
         elif interacted:
-            self.items[0], self.items[index] = self.items[index], self.items[0]
+            # bringing an item to the top changes what overlaps, redraw both
+            if index != 0:
+                top, item = self.items[0], self.items[index]
+                top.dirty = True
+                self.dirty_items.add(top)
+                self.items[0], self.items[index] = item, top
+                self.z[top], self.z[item] = self.z[item], self.z[top]
+                self.note_swap(item, top, index)
             self.default_color = self.items[0].color_idx
 
-        # if nothing interacted with event,
-        if not (searched or interacted):
+        # if nothing interacted with event (and nothing holds the pointer),
+        if not (searched or interacted) and self.captor is None:
             if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
                 self.clicked = True
                 self.clicked_x, self.clicked_y = event.pos
-                # and the event is a dragged left click, then add a new ChalkLine
-                x, y = pg.mouse.get_pos()
-                self.add_chalkline(self.clicked_x, self.clicked_y , x, y, 6, self.default_color, False)
+                # and the event is a dragged left click, then add a new ChalkStroke
+                # following the mouse, or a straight ChalkLine if {SHIFT} is held
+                if pg.key.get_mods() & pg.KMOD_SHIFT:
+                    self.add_chalkline(self.clicked_x, self.clicked_y , self.clicked_x, self.clicked_y, 6, self.default_color, False)
+                else:
+                    self.add_chalkstroke(self.clicked_x, self.clicked_y, (0, 0), 6, self.default_color, False)
             # and the event is a left click, then add a new ChalkText
             elif event.type == pg.MOUSEBUTTONUP and self.clicked:
                 x, y = event.pos
@@ -52,27 +143,392 @@ class BlackBoard():
                     self.add_chalktext('', x, y - CHALK_FONTSIZE//2, CHALK_FONTSIZE, self.default_color, True)
                 self.clicked = False
                 self.clicked_x, self.clicked_y = 0, 0
-        # instantiate any new pinned apps
+
+    def route(self, event, hit):
+        # items an event goes to, top-most first: the item holding the pointer
+        # gets every pointer event and no other item does, else a click goes to
+        # the focused item and (if hit) the items under it; a key goes to the
+        # item holding the pointer (any key closes a menu) and the focused one
+        if event.type in (pg.MOUSEMOTION, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP):
+            if self.captor is not None:
+                return [self.captor]
+            if event.type == pg.MOUSEMOTION:
+                return []
+            candidates = self.grid.query_point(event.pos) if hit else set()
+            # test the lines among them against the click at once (each one's
+            # hit() then reads its answer)
+            self.lines.mask_point(event.pos, LINE_HIT_TOLERANCE,
+                                  [item.slot for item in candidates if isinstance(item, ChalkLine)])
+        elif event.type == pg.KEYDOWN:
+            candidates = {self.captor}
+        else:
+            return []
+        candidates.add(self.focus)
+        candidates.discard(None)
+        return sorted(candidates, key=self.z.__getitem__)
+
+    def handle_view_event(self, event):
+        # middle button drag pans, the wheel zooms in/out around the mouse;
+        # returns whether the event was used (items never see it)
+        if event.type == pg.MOUSEWHEEL:
+            # (wheel events have no position, except replayed ones, see eventtrace)
+            pos = event.pos if hasattr(event, "pos") else pg.mouse.get_pos()
+            if self.view.zoom_at(pos, event.y):
+                self.invalidate()
+            return True
+        if event.type in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP) and event.button == 2:
+            self.panning = event.type == pg.MOUSEBUTTONDOWN
+            return True
+        if event.type == pg.MOUSEMOTION and self.panning:
+            self.view.pan(*event.rel)
+            self.invalidate()
+            return True
+        return False
+
+    def poll(self):
+        # search-as-you-type: send the typed query, take in its matches
+        self.searchbar.poll()
+        # instantiate any new pinned apps, somewhere in view
         new_apps = self.searchbar.get_search_results()
         for path in new_apps:
-            randx = r.randint(10, WIDTH//1.5)
-            randy = r.randint(10, HEIGHT//1.5)
-            self.add_app(path, randx, randy, self.default_color, None)
+            randx = r.randint(10, self.window.w//1.5)
+            randy = r.randint(10, self.window.h//1.5)
+            self.add_app(path, *self.view.to_world((randx, randy)), self.default_color, None)
+        # hand finished background work to the items waiting for it (icons)
+        for app in icons.loader.pump():
+            if app in self.z:
+                self.dirty_items.add(app)
+                self.reindex(app)
+        # build the next few saved items
+        if self.loader is not None:
+            self.load_some()
+        # write out the journal now and then (the board is only compacted once
+        # all of it is loaded)
+        if self.journal is not None:
+            self.journal.tick(compact=self.loader is None)
+
+    def next_wakeup(self):
+        # seconds until poll() has work to do (0 while the board is loading),
+        # None if only new events can bring some; work finishing in other
+        # threads (icons, search results) wakes the main loop up by itself
+        if self.loader is not None:
+            return 0
+        waits = [self.searchbar.due()]
+        if self.journal is not None:
+            waits.append(self.journal.due())
+        return min((wait for wait in waits if wait is not None), default=None)
+
+    def load_some(self):
+        for z, uid, args in self.loader.take(LOAD_BUDGET):
+            self.load_record(uid, args, z)
+        # paint what was loaded (and the progress indicator) now and then, the
+        # indicator goes away at the end
+        now = time.perf_counter()
+        if self.loader.finished or now - self.shown_at >= LOAD_REDRAW_INTERVAL:
+            self.dirty_items.update(self.unshown)
+            self.unshown = []
+            self.shown_at = now
+            if self.loader.rect is not None:
+                self.damaged.append(self.loader.rect)
+        if self.loader.finished:
+            self.loader = None
+
+    def loading(self):
+        return self.loader is not None
 
     def add_app(self, path, x, y, color, name):
-        self.items.append(App(path, x, y, color, name))
+        self.add_item(App(path, x, y, color, name))
 
     def add_chalktext(self, text, x, y, fontsize, color, new):
-        self.items.append(ChalkText(text, x, y, fontsize, color, new))
+        self.add_item(ChalkText(text, x, y, fontsize, color, new))
 
     def add_chalkline(self, s_x, s_y, e_x, e_y, width, color, drawn):
-        self.items.append(ChalkLine(s_x, s_y, e_x, e_y, width, color, drawn))
+        self.add_item(ChalkLine(s_x, s_y, e_x, e_y, width, color, drawn, self.lines))
+
+    def add_chalkstroke(self, x, y, points, width, color, drawn):
+        self.add_item(ChalkStroke(x, y, points, width, color, drawn))
+
+    def load_record(self, uid, args, z=None):
+        # make a saved item (record as read by savefile), it is journaled already
+        if args[0] == "ChalkText":
+            item = ChalkText(*args[1:], False)
+        elif args[0] == "ChalkLine":
+            item = ChalkLine(*args[1:], True, self.lines)
+        elif args[0] == "ChalkStroke":
+            item = ChalkStroke(*args[1:], True)
+        elif args[0] == "App":
+            item = App(*args[1:])
+        else:
+            return
+        self.add_item(item, uid, args, z)
+
+    def add_item(self, item, uid=None, record=None, z=None):
+        # loaded items keep their uid (and their record is what was journaled),
+        # new ones get the next free one
+        if uid is None:
+            uid = self.next_uid
+        item.uid = uid
+        self.next_uid = max(self.next_uid, uid + 1)
+        if record is not None and self.journal is not None:
+            self.saved[item] = record
+        if z is None:
+            # new items go to the bottom of the stack
+            self.items.append(item)
+            self.z[item] = self.next_z
+            self.next_z += 1
+            self.dirty_items.add(item)
+        else:
+            # loaded items go back to their place in it
+            self.z[item] = z
+            bisect.insort(self.items, item, key=self.z.__getitem__)
+            self.unshown.append(item)
+        self.reindex(item)
+
+    def remove_item(self, index):
+        # whatever the item covered on screen has to be repainted
+        item = self.items.pop(index)
+        self.dirty_items.discard(item)
+        self.engaged.discard(item)
+        if self.captor is item:
+            self.captor = None
+        if self.focus is item:
+            self.focus = None
+        self.grid.remove(item)
+        del self.z[item]
+        if isinstance(item, ChalkLine):
+            self.lines.remove(item.slot)
+        if item.drawn_rect is not None:
+            rect = self.view.rect_to_screen(item.drawn_rect)
+            self.damaged.append(rect)
+            if item not in self.live:
+                self.stale.append(rect)
+        self.live.discard(item)
+        if item in self.saved:
+            del self.saved[item]
+            self.journal.append(DELETE, item.uid)
+
+    def reindex(self, item):
+        # sync the hitbox and engaged state of an item after it changed
+        item.update()
+        self.grid.update(item, item.get_bounds())
+        if item.captures():
+            self.captor = item
+        elif self.captor is item:
+            self.captor = None
+        if item.editing():
+            # one item has the keyboard focus, the one that had it lets go
+            if self.focus is not None and self.focus is not item:
+                old, self.focus = self.focus, item
+                old.blur()
+                self.dirty_items.add(old)
+                self.reindex(old)
+            self.focus = item
+        elif self.focus is item:
+            self.focus = None
+        if item.engaged():
+            self.engaged.add(item)
+        else:
+            self.engaged.discard(item)
+            self.note(item)
+
+    def note(self, item):
+        # journal whatever changed about an item since it was last journaled
+        # (only once it is let go of, a drag is one move)
+        if self.journal is None:
+            return
+        record = item.record()
+        saved = self.saved.get(item)
+        if record == saved:
+            return
+        if record is None:
+            del self.saved[item]
+            self.journal.append(DELETE, item.uid)
+            return
+        self.saved[item] = record
+        op = classify(saved, record)
+        if op == ADD:
+            # new items are near the bottom, look for them from there
+            index = len(self.items) - 1
+            while self.items[index] is not item:
+                index -= 1
+            self.journal.append(ADD, item.uid, record, self.saved_above(index))
+        else:
+            self.journal.append(op, item.uid, record)
+
+    def note_swap(self, item, top, index):
+        # journal item (now on top) and top (now at index) swapping places,
+        # items that aren't saved have no place in the journal
+        if self.journal is None:
+            return
+        if item in self.saved and top in self.saved:
+            self.journal.append(SWAP, item.uid, other=top.uid)
+        elif item in self.saved:
+            self.journal.append(PLACE, item.uid, other=self.saved_above(0))
+        elif top in self.saved:
+            self.journal.append(PLACE, top.uid, other=self.saved_above(index))
+
+    def saved_above(self, index):
+        # uid of the closest saved item above items[index], None if there is
+        # none; saved items not loaded yet count too
+        above = None
+        for i in range(index - 1, -1, -1):
+            if self.items[i] in self.saved:
+                above = self.items[i]
+                break
+        if self.loader is not None:
+            stop = self.z[above] if above is not None else -1
+            uid = self.loader.above(self.z[self.items[index]], stop)
+            if uid is not None:
+                return uid
+        return above.uid if above is not None else None
+
+    def saved_items(self):
+        # (uid, record) of the board as journaled, top-most first
+        return [(item.uid, self.saved[item]) for item in self.items if item in self.saved]
+
+    def save(self):
+        # make sure everything journaled so far is on disk
+        if self.journal is not None:
+            self.journal.flush(sync=True)
+
+    def invalidate(self):
+        # bake and repaint the whole window on the next frame (e.g. after the
+        # view moved)
+        self.rebake = True
+
+    def expose(self):
+        # repaint the whole window from the layer (the window lost its contents)
+        self.full_redraw = True
+
+    def resize(self, size):
+        # the window changed size: what is baked stays, only the parts that
+        # came into view are baked, then the window is repainted from the layer
+        old = self.layer
+        self.window = pg.Rect((0, 0), size)
+        self.full_redraw = True
+        if old is None:
+            self.layer = pg.Surface(size)
+            self.rebake = True
+            return
+        self.layer = pg.Surface(size, 0, old)
+        self.layer.blit(old, (0, 0))
+        # (strips that don't overlap, or they would be merged into one big rect)
+        w, h = old.get_size()
+        self.stale.append(pg.Rect(w, 0, size[0] - w, min(h, size[1])))
+        self.stale.append(pg.Rect(0, h, size[0], size[1] - h))
+
+    def draw_dirty(self, screen):
+        # repaint only the regions that changed since the last frame,
+        # returns the rectangles that need to be flipped to the display
+        if self.layer is None or self.layer.get_size() != screen.get_size():
+            self.resize(screen.get_size())
+        screen_rect = screen.get_rect()
+        # items picked up or let go of move between the layer and the top
+        self.dirty_items.update(self.engaged ^ self.live)
+        # collect old and new areas (on the window) of everything that changed,
+        # the ones of idle items (before or after) are baked again
+        start = profiler.now()
+        rects = self.damaged
+        stale = self.stale
+        self.damaged, self.stale = [], []
+        if self.searchbar.dirty or self.searchbar.drawn_rect is None:
+            if self.searchbar.drawn_rect is not None:
+                stale.append(self.searchbar.drawn_rect)
+            self.searchbar.update()
+            self.searchbar.drawn_rect = self.searchbar.get_bounds()
+            self.searchbar.dirty = False
+            stale.append(self.searchbar.drawn_rect)
+        for item in self.dirty_items:
+            if item.drawn_rect is not None:
+                rect = self.view.rect_to_screen(item.drawn_rect)
+                rects.append(rect)
+                if item not in self.live:
+                    stale.append(rect)
+            item.update()
+            item.drawn_rect = item.get_bounds()
+            item.dirty = False
+            rect = self.view.rect_to_screen(item.drawn_rect)
+            rects.append(rect)
+            if item.engaged():
+                self.live.add(item)
+            else:
+                self.live.discard(item)
+                stale.append(rect)
+            if item in self.grid:
+                self.grid.update(item, item.drawn_rect)
+        self.dirty_items.clear()
+        profiler.add("update", start)
+        if self.rebake:
+            self.rebake = False
+            stale = [screen_rect]
+        if self.full_redraw:
+            self.full_redraw = False
+            rects = [screen_rect]
+        # bake the stale regions, then repaint the damaged ones from the layer
+        # with the live items (bottom-most first) and the overlays on top
+        stale = merge_rects(stale, screen_rect)
+        start = profiler.now()
+        for rect in stale:
+            self.bake(rect)
+        profiler.add("bake", start)
+        start = profiler.now()
+        rects = merge_rects(rects + stale, screen_rect)
+        live = sorted(self.live, key=self.z.__getitem__, reverse=True)
+        for rect in rects:
+            screen.set_clip(rect)
+            screen.blit(self.layer, rect, rect)
+            for item in live:
+                if self.view.rect_to_screen(item.drawn_rect).colliderect(rect):
+                    self.draw_item(item, screen)
+            if self.searchbar.rows and self.searchbar.drawn_rect.colliderect(rect):
+                self.searchbar.draw_dropdown(screen)
+            if self.loader is not None and self.loader.get_rect(screen).colliderect(rect):
+                self.loader.draw(screen)
+        screen.set_clip(None)
+        profiler.add("repaint", start)
+        return rects
+
+    def draw_item(self, item, screen):
+        # (counted and timed by type when profiling)
+        if profiler.enabled:
+            start = profiler.now()
+            item.draw(screen, self.view)
+            profiler.drew(item, start)
+        else:
+            item.draw(screen, self.view)
+
+    def bake(self, rect):
+        # clear a region of the layer, then draw (bottom-most first) the idle
+        # items overlapping the board area it shows, skipping lines whose
+        # bounding box overlaps the region but not the stroke
+        layer = self.layer
+        layer.set_clip(rect)
+        layer.fill(BACKGROUND_COLOR, rect)
+        if self.searchbar.drawn_rect.colliderect(rect):
+            self.searchbar.draw(layer)
+        area = self.view.rect_to_world(rect)
+        found = self.grid.query_rect(area) - self.live
+        lines = [item for item in found if isinstance(item, ChalkLine)]
+        crossing = self.lines.mask_rect(area, 2, [line.slot for line in lines])
+        found.difference_update(line for line, crosses in zip(lines, crossing) if not crosses)
+        for item in sorted(found, key=self.z.__getitem__, reverse=True):
+            self.draw_item(item, layer)
+        layer.set_clip(None)
 
     def draw(self, screen):
+        self.window = screen.get_rect()
         # draw search bar
         self.searchbar.update()
         self.searchbar.draw(screen)
-        # draw the rest of the items
-        for item in reversed(self.items):
+        # draw the rest of the items, only the ones in view (bottom-most first),
+        # the ones being dragged, typed into or showing a menu go on top
+        shown = self.grid.query_rect(self.view.rect_to_world(self.window))
+        for item in sorted(shown, key=lambda item: (not item.engaged(), self.z[item]), reverse=True):
             item.update()
-            item.draw(screen)
+            self.draw_item(item, screen)
+        # search dropdown goes over the items
+        if self.searchbar.rows:
+            self.searchbar.draw_dropdown(screen)
+        # so does the progress of loading the board
+        if self.loader is not None:
+            self.loader.draw(screen)
@@ -0,0 +1,77 @@
+import pygame as pg
+import time
+
+from header import *
+from fonts import get_font
+
+def record_rect(record):
+    # rough area of a saved item, enough to tell whether it is on screen
+    if record[0] == "ChalkLine":
+        s_x, s_y, e_x, e_y, width = record[1:6]
+        return pg.Rect(min(s_x, e_x), min(s_y, e_y), abs(e_x - s_x) + 1, abs(e_y - s_y) + 1).inflate(width, width)
+    if record[0] == "ChalkStroke":
+        x, y, points, width = record[1:5]
+        xs, ys = points[0::2], points[1::2]
+        return pg.Rect(x + min(xs), y + min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1).inflate(width, width)
+    if record[0] == "ChalkText":
+        text, x, y, fontsize = record[1:5]
+        return pg.Rect(x, y, len(text) * fontsize // 2 + 1, fontsize)
+    x, y = record[2:4]
+    return pg.Rect(x, y, LOAD_ITEM_SIZE, LOAD_ITEM_SIZE)
+
+
+class BoardLoader:
+    def __init__(self, records, view):
+        # (uid, record) of the board, top-most first, all read up front (reading
+        # is cheap, making the items is what takes time); the place of a record
+        # in the stack is its index, and the ones inside view go first
+        self.records = list(records)
+        self.count = len(self.records)
+        self.next_uid = max((uid for uid, record in self.records), default=-1) + 1
+        visible = [i for i, (uid, record) in enumerate(self.records) if view.colliderect(record_rect(record))]
+        shown = set(visible)
+        self.order = visible + [i for i in range(self.count) if i not in shown]
+        self.done = bytearray(self.count)
+        self.loaded = 0
+        # set once the last item was made, and where the progress was drawn
+        self.finished = False
+        self.rect = None
+
+    def take(self, budget):
+        # generator of the (index, uid, record) to make next, until budget
+        # seconds ran out (at least one per call)
+        end = time.perf_counter() + budget
+        while self.loaded < self.count:
+            i = self.order[self.loaded]
+            self.done[i] = 1
+            self.loaded += 1
+            yield (i,) + self.records[i]
+            if time.perf_counter() >= end:
+                break
+        if self.loaded == self.count:
+            self.finished = True
+            self.records = self.order = None
+
+    def above(self, z, stop):
+        # uid of the closest record above place z and below place stop that
+        # isn't loaded yet, or None
+        for i in range(min(z, self.count) - 1, stop, -1):
+            if not self.done[i]:
+                return self.records[i][0]
+        return None
+
+    def get_rect(self, screen):
+        # progress indicator in the top right corner of the board
+        w = LOAD_BAR_WIDTH
+        h = OPTMENU_FONTSIZE * 2 + LOAD_BAR_HEIGHT
+        return pg.Rect(screen.get_width() - BORDER_WIDTH - w - 10, BORDER_WIDTH + 10, w, h)
+
+    def draw(self, screen):
+        self.rect = self.get_rect(screen)
+        font = get_font(OPTMENU_FONT, OPTMENU_FONTSIZE)
+        text = font.render("Loading board %d / %d" % (self.loaded, self.count), True, OPTMENU_TEXT_COLOR)
+        screen.blit(text, self.rect.topleft)
+        bar = pg.Rect(self.rect.x, self.rect.bottom - LOAD_BAR_HEIGHT, self.rect.w, LOAD_BAR_HEIGHT)
+        pg.draw.rect(screen, OPTMENU_COLOR, bar)
+        bar.w = bar.w * self.loaded // max(self.count, 1)
+        pg.draw.rect(screen, OPTMENU_COLOR_HOVERED, bar)
@@ -0,0 +1,141 @@
+import pygame as pg
+import struct, time
+
+import savefile
+
+# trace file layout: MAGIC, a version number, the window size and the board
+# the session started with (a count, then length-prefixed savefile records),
+# then one entry per event: milliseconds since the start, the event type and
+# its fields (below); FRAME entries end the events of a frame
+MAGIC = b"UIBT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHI")
+ENTRY = struct.Struct("<IH")
+FRAME = 0
+# fields kept of the events main.py handles (the rest aren't recorded); the
+# modifier keys held are kept with mouse events too, and where the mouse was
+# with wheel events, as the board asks pygame for those
+FIELDS = {
+    pg.MOUSEMOTION: struct.Struct("<hhhhBH"),   # x, y, rel x, rel y, buttons held (bits), mods
+    pg.MOUSEBUTTONDOWN: struct.Struct("<hhBH"), # x, y, button, mods
+    pg.MOUSEBUTTONUP: struct.Struct("<hhBH"),   # x, y, button, mods
+    pg.MOUSEWHEEL: struct.Struct("<hhhhH"),     # x, y (steps), mouse x, y, mods
+    pg.KEYDOWN: struct.Struct("<iHB"),          # key, mods, length of the text typed, then the text
+    pg.VIDEORESIZE: struct.Struct("<HH"),       # width, height
+    pg.VIDEOEXPOSE: struct.Struct(""),
+    pg.WINDOWEXPOSED: struct.Struct(""),
+    pg.QUIT: struct.Struct(""),
+}
+
+def encode(event):
+    # fields of an event as stored in a trace, None if it isn't recorded
+    fields = FIELDS.get(event.type)
+    if fields is None:
+        return None
+    if event.type == pg.MOUSEMOTION:
+        buttons = sum(1 << i for i, held in enumerate(event.buttons) if held)
+        return fields.pack(*event.pos, *event.rel, buttons, pg.key.get_mods())
+    if event.type in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP):
+        return fields.pack(*event.pos, event.button, pg.key.get_mods())
+    if event.type == pg.MOUSEWHEEL:
+        return fields.pack(event.x, event.y, *pg.mouse.get_pos(), pg.key.get_mods())
+    if event.type == pg.KEYDOWN:
+        text = event.unicode.encode("utf-8")[:255]
+        return fields.pack(event.key, event.mod, len(text)) + text
+    if event.type == pg.VIDEORESIZE:
+        return fields.pack(event.w, event.h)
+    return b""
+
+def decode(kind, data, offset):
+    # (event, offset past it) out of the fields stored at offset
+    fields = FIELDS[kind]
+    values = fields.unpack_from(data, offset)
+    offset += fields.size
+    if kind == pg.MOUSEMOTION:
+        x, y, rel_x, rel_y, buttons, mod = values
+        attrs = {"pos": (x, y), "rel": (rel_x, rel_y), "buttons": tuple(buttons >> i & 1 for i in range(3)), "mod": mod}
+    elif kind in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP):
+        x, y, button, mod = values
+        attrs = {"pos": (x, y), "button": button, "mod": mod}
+    elif kind == pg.MOUSEWHEEL:
+        x, y, mouse_x, mouse_y, mod = values
+        attrs = {"x": x, "y": y, "flipped": False, "pos": (mouse_x, mouse_y), "mod": mod}
+    elif kind == pg.KEYDOWN:
+        key, mod, n = values
+        attrs = {"key": key, "mod": mod, "unicode": data[offset:offset+n].decode("utf-8"), "scancode": 0}
+        offset += n
+    elif kind == pg.VIDEORESIZE:
+        w, h = values
+        attrs = {"w": w, "h": h, "size": (w, h)}
+    else:
+        attrs = {}
+    return pg.event.Event(kind, attrs), offset
+
+
+class TraceRecorder:
+    def __init__(self, file, size, board):
+        # records the events of a session in file, along with the window size
+        # and the board ((uid, record), top-most first) it started with
+        self.file = open(file, "wb")
+        self.start = time.perf_counter()
+        self.events = 0
+        self.pending = False
+        self.file.write(HEADER.pack(MAGIC, VERSION, size[0], size[1], len(board)))
+        for uid, record in board:
+            body = savefile.encode(uid, record)
+            self.file.write(savefile.LENGTH.pack(len(body)) + body)
+
+    def entry(self, kind):
+        return ENTRY.pack(int((time.perf_counter() - self.start) * 1000), kind)
+
+    def record(self, event):
+        data = encode(event)
+        if data is not None:
+            self.file.write(self.entry(event.type) + data)
+            self.events += 1
+            self.pending = True
+
+    def frame(self):
+        # end of the events handled in a frame (nothing if none were recorded)
+        if self.pending:
+            self.file.write(self.entry(FRAME))
+            self.pending = False
+
+    def close(self):
+        self.frame()
+        self.file.close()
+
+
+def read_trace(file):
+    # (window size, board, entries) of a trace, entries being (ms, event),
+    # event None at the end of a frame
+    with open(file, "rb") as f:
+        data = f.read()
+    magic, version, w, h, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("%s is not a UIbb trace" % file)
+    if version > VERSION:
+        raise ValueError("%s was recorded by a newer version of UIbb (trace format %d)" % (file, version))
+    offset = HEADER.size
+    board = []
+    for i in range(count):
+        n, = savefile.LENGTH.unpack_from(data, offset)
+        offset += savefile.LENGTH.size
+        uid, record = savefile.decode(data, offset)
+        offset += n
+        if record is not None:
+            board.append((uid, record))
+    # an entry cut short at the end (the session didn't exit cleanly) is dropped
+    entries = []
+    while offset + ENTRY.size <= len(data):
+        ms, kind = ENTRY.unpack_from(data, offset)
+        offset += ENTRY.size
+        if kind == FRAME:
+            entries.append((ms, None))
+            continue
+        try:
+            event, offset = decode(kind, data, offset)
+        except struct.error:
+            break
+        entries.append((ms, event))
+    return (w, h), board, entries
@@ -0,0 +1,261 @@
+from fnmatch import fnmatch, fnmatchcase
+from pathlib import PurePath
+from threading import Lock, Thread
+import os, sqlite3, heapq
+
+# file names are case-insensitive wherever normcase folds them (windows)
+CASE_SENSITIVE = os.path.normcase("A") == "A"
+
+def name_key(name):
+    return name if CASE_SENSITIVE else name.lower()
+
+def glob_to_sqlite(pattern):
+    # fnmatch and sqlite GLOB share *, ? and [...], only negation is spelled differently
+    return pattern.replace("[!", "[^")
+
+def matcher(pattern):
+    # predicate telling whether an entry (path, name) matches pattern the way
+    # Path(root).rglob(pattern) would; a pattern with separators matches the
+    # trailing components of the path
+    pattern = pattern.replace("\\", "/") if os.sep == "\\" else pattern
+    last = pattern.rstrip("/").split("/")[-1]
+    match_name = fnmatchcase if CASE_SENSITIVE else fnmatch
+    whole = "/" in pattern.rstrip("/")
+    def match(path, name):
+        return match_name(name, last) and (not whole or PurePath(path).match(pattern))
+    return match
+
+def _fuzzy_run(query, lname, name, start):
+    # score of matching query in lname with its first character at start,
+    # taking every later character as early as possible (None if one is missing)
+    score, i, prev = 0, start, -2
+    for c in query:
+        i = lname.find(c, i)
+        if i < 0:
+            return None
+        score += 1
+        if i == prev + 1:
+            score += 8
+        elif i == 0 or not lname[i-1].isalnum() or (name[i].isupper() and name[i-1].islower()):
+            score += 6
+        if prev >= 0:
+            score -= min(i - prev - 1, 3)
+        prev = i
+        i += 1
+    return score + 10 if start == 0 else score
+
+def fuzzy_score(query, name):
+    # how well name matches a lowercase query whose characters appear in it
+    # in order (None if they don't): every match scores, runs of consecutive
+    # matches and matches starting a word score extra, skipped characters
+    # cost a little, the best of the first few starting points is kept
+    lname = name.lower()
+    if len(lname) != len(name):
+        name = lname
+    best = None
+    start = lname.find(query[0])
+    for _ in range(4):
+        if start < 0:
+            break
+        score = _fuzzy_run(query, lname, name, start)
+        if score is None:
+            # no later start can match either
+            break
+        if best is None or score > best:
+            best = score
+        start = lname.find(query[0], start + 1)
+    if best is not None:
+        # whole names (or whole names but the extension) first, then shorter names
+        stem = lname.rsplit(".", 1)[0] if "." in lname[1:] else lname
+        if lname == query or stem == query:
+            best += 50
+        best -= len(name) / 10
+    return best
+
+def like_escape(text):
+    # text as a literal LIKE pattern, escaped with a backslash
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def literal_prefix(pattern):
+    # the part of a pattern before its first wildcard
+    for i, c in enumerate(pattern):
+        if c in "*?[":
+            return pattern[:i]
+    return pattern
+
+
+class FileIndex:
+    def __init__(self, db_file, roots, excludes):
+        # sqlite file holding every entry under roots, minus excluded
+        # paths (absolute) or names (anywhere, wildcards allowed)
+        self.db_file = db_file
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        self.excluded_paths = {os.path.abspath(e) for e in excludes if os.path.isabs(e)}
+        self.excluded_names = [e for e in excludes if not os.path.isabs(e)]
+        # only one refresh walks the roots at a time
+        self.refresh_lock = Lock()
+        self.refreshing = None
+
+    def connect(self):
+        # one connection per thread; WAL lets searches read while a refresh writes
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER);
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY, parent TEXT, name TEXT, key TEXT, is_dir INTEGER);
+            CREATE INDEX IF NOT EXISTS entries_key ON entries (key);
+            CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+        """)
+        return conn
+
+    def ready(self):
+        # true once a full walk of the current roots has finished
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'roots'").fetchone()
+        finally:
+            conn.close()
+        return row is not None and row[0] == "\n".join(self.roots)
+
+    def excluded(self, path, name):
+        if path in self.excluded_paths:
+            return True
+        return any(fnmatch(name, pattern) for pattern in self.excluded_names)
+
+    def _forget(self, conn, path):
+        # drop a directory that disappeared, along with everything below it
+        lo, hi = path.rstrip(os.sep) + os.sep, path.rstrip(os.sep) + chr(ord(os.sep) + 1)
+        conn.execute("DELETE FROM entries WHERE path >= ? AND path < ?", (lo, hi))
+        conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, lo, hi))
+
+    def refresh(self):
+        # walk the roots with os.scandir, only re-listing directories whose mtime
+        # changed since the last walk (adding/removing/renaming an entry updates
+        # its directory's mtime); unchanged directories are descended using the
+        # subdirectories already in the index
+        with self.refresh_lock:
+            conn = self.connect()
+            try:
+                walked = 0
+                for root in self.roots:
+                    stack = [root]
+                    while stack:
+                        path = stack.pop()
+                        stack.extend(self._refresh_dir(conn, path))
+                        walked += 1
+                        if walked % 500 == 0:
+                            conn.commit()
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('roots', ?)", ("\n".join(self.roots),))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _refresh_dir(self, conn, path):
+        # bring one directory up to date, returns its subdirectories to walk next
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(conn, path)
+            return []
+        row = conn.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return [p for (p,) in conn.execute(
+                "SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (path,))]
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.excluded(entry.path, entry.name):
+                        continue
+                    # like rglob, symlinked directories are listed but not descended
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.path, path, entry.name, name_key(entry.name), int(is_dir)))
+        except OSError:
+            pass
+        current = {e[0] for e in entries}
+        for old, was_dir in conn.execute("SELECT path, is_dir FROM entries WHERE parent = ?", (path,)).fetchall():
+            if old not in current:
+                conn.execute("DELETE FROM entries WHERE path = ?", (old,))
+                if was_dir:
+                    self._forget(conn, old)
+        conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", entries)
+        conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (path, mtime))
+        return [e[0] for e in entries if e[4]]
+
+    def refresh_async(self):
+        # refresh on a background thread, unless one is already running
+        if self.refreshing is None or not self.refreshing.is_alive():
+            self.refreshing = Thread(target=self.refresh, daemon=True)
+            self.refreshing.start()
+        return self.refreshing
+
+    def suggest(self, query, limit, cancel=None):
+        # the limit best fuzzy matches (fuzzy_score) of query against entry
+        # names, best first; sqlite narrows the candidates down to names holding
+        # the query's characters in order (case-insensitive LIKE), they are then
+        # scored in chunks so cancel (an Event) can stop a query gone stale
+        query = query.lower()
+        if not query:
+            return []
+        pattern = "%" + "%".join(like_escape(c) for c in query) + "%"
+        conn = self.connect()
+        try:
+            cursor = conn.execute("SELECT path, name FROM entries WHERE name LIKE ? ESCAPE '\\'", (pattern,))
+            best = []
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return []
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for path, name in rows:
+                    score = fuzzy_score(query, name)
+                    if score is None:
+                        continue
+                    # deeper paths lose ties
+                    entry = (score, -path.count(os.sep), path)
+                    if len(best) < limit:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+        finally:
+            conn.close()
+        return [path for score, depth, path in sorted(best, reverse=True)]
+
+    def search(self, pattern, limit=None):
+        # paths matching pattern (see matcher): exact names and literal prefixes
+        # use the index, other globs are narrowed by sqlite GLOB, then every
+        # hit is checked with matcher
+        pattern = pattern.replace("\\", "/") if os.sep == "\\" else pattern
+        last = pattern.rstrip("/").split("/")[-1]
+        if not last:
+            return
+        match = matcher(pattern)
+        key = name_key(last)
+        prefix = literal_prefix(key)
+        if prefix == key:
+            sql, args = "SELECT path, name FROM entries WHERE key = ?", (key,)
+        elif prefix:
+            sql, args = ("SELECT path, name FROM entries WHERE key >= ? AND key < ? AND key GLOB ?",
+                         (prefix, prefix + "\U0010ffff", glob_to_sqlite(key)))
+        else:
+            sql, args = "SELECT path, name FROM entries WHERE key GLOB ?", (glob_to_sqlite(key),)
+        conn = self.connect()
+        try:
+            found = 0
+            for path, name in conn.execute(sql, args):
+                if not match(path, name):
+                    continue
+                yield path
+                found += 1
+                if limit is not None and found >= limit:
+                    break
+        finally:
+            conn.close()
@@ -0,0 +1,96 @@
+import pygame as pg
+from collections import OrderedDict
+import time
+
+from header import *
+
+class FontRegistry:
+    def __init__(self, capacity):
+        # fonts keyed by (font path, size), least recently used first
+        self.capacity = capacity
+        self.fonts = OrderedDict()
+        # counters for cache hits/misses and total time spent loading fonts
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def get(self, path, size):
+        key = (path, size)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.hits += 1
+            self.fonts.move_to_end(key)
+            return font
+        # not loaded yet (or evicted), parse the font file
+        self.misses += 1
+        start = time.perf_counter()
+        font = pg.font.Font(path, size)
+        self.load_time += time.perf_counter() - start
+        self.fonts[key] = font
+        if len(self.fonts) > self.capacity:
+            self.fonts.popitem(last=False)
+        return font
+
+    def preload(self, keys):
+        # load fonts (path, size) ahead of their first use, e.g. at startup
+        for path, size in keys:
+            self.get(path, size)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "load_time": self.load_time, "size": len(self.fonts)}
+
+
+# one registry shared by every item, menu and widget
+fonts = FontRegistry(FONT_CACHE_SIZE)
+
+def get_font(path, size):
+    return fonts.get(path, size)
+
+
+class TextCache:
+    def __init__(self, budget):
+        # rendered text surfaces, least recently used first, capped at budget bytes
+        self.budget = budget
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        # counters for cache hits/misses, surfaces dropped to stay in budget
+        # and total time spent rendering text
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.render_time = 0.0
+
+    def render(self, path, size, text, color, antialias=True):
+        # surfaces are shared between callers, they must only be blitted
+        key = (text, path, size, tuple(pg.Color(color)), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        start = time.perf_counter()
+        surface = fonts.get(path, size).render(text, antialias, color)
+        self.render_time += time.perf_counter() - start
+        cost = surface.get_width() * surface.get_height() * surface.get_bytesize()
+        if cost > self.budget:
+            return surface
+        self.surfaces[key] = surface
+        self.bytes += cost
+        while self.bytes > self.budget:
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes": self.bytes, "size": len(self.surfaces), "render_time": self.render_time}
+
+
+# one text cache shared by every item, menu and widget
+texts = TextCache(TEXT_CACHE_BYTES)
+
+def render_text(path, size, text, color, antialias=True):
+    return texts.render(path, size, text, color, antialias)
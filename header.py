@@ -1,7 +1,47 @@
 # frames per second
 FPS = 30
-# file to save and load from
-SAVEFILE = "save/save.csv"
+# main loop: wait for events (or background work) instead of drawing FPS frames
+# a second, drawing at most FPS_ACTIVE frames a second while events come in
+# (dragging, typing) and none at all when nothing happens
+EVENT_DRIVEN = True
+FPS_ACTIVE = 60
+# what the event-driven loop should hold to: time (s) from background work
+# calling wake() to the main loop taking the event, and share (%) of a CPU
+# used while nothing happens (bench.py measures both, the profiler the first)
+WAKEUP_TARGET = 0.005
+IDLE_CPU_TARGET = 1.0
+# frame profiler ({F3} shows its overlay, main.py --profile-log FILE keeps its
+# metrics): frames the overlay covers, the bounds (ms) of its frame time
+# histogram's bars and their height (px), how often (s) a line goes to the
+# metrics log and how big (bytes) the log grows before it is rotated
+PROFILE_FRAMES = 300
+PROFILE_BUCKETS = (1, 2, 4, 8, 16, 33, 66)
+PROFILE_HISTOGRAM_HEIGHT = 70
+PROFILE_LOG_INTERVAL = 5
+PROFILE_LOG_BYTES = 1 << 20
+# only repaint (and flip) the regions of the window that changed since the last frame
+DIRTY_RECTS = True
+# size (px) of the cells of the grid used to find items under the cursor
+GRID_CELL_SIZE = 64
+# file to save and load from, and the old ",,"-delimited save read if there is none yet
+SAVEFILE = "save/save.uibb"
+LEGACY_SAVEFILE = "save/save.csv"
+# edits are journaled next to the save file: buffered entries are written every
+# JOURNAL_FLUSH_OPS entries or JOURNAL_FLUSH_INTERVAL seconds, and the save file
+# is rewritten in the background every JOURNAL_COMPACT_OPS entries
+JOURNAL_FLUSH_OPS = 64
+JOURNAL_FLUSH_INTERVAL = 1.0
+JOURNAL_COMPACT_OPS = 5000
+# build the saved items a few at a time (LOAD_BUDGET seconds per frame, the
+# ones on screen first, painted every LOAD_REDRAW_INTERVAL seconds) so the
+# board is usable right away; the rough size (px) of a saved app when telling
+# whether it is on screen, and the size (px) of the progress bar
+LOAD_PROGRESSIVE = True
+LOAD_BUDGET = 0.012
+LOAD_REDRAW_INTERVAL = 0.25
+LOAD_ITEM_SIZE = 100
+LOAD_BAR_WIDTH = 200
+LOAD_BAR_HEIGHT = 4
 
 # blackboard dimensions and colors
 WIDTH = 900
@@ -9,19 +49,70 @@ HEIGHT = 600
 BACKGROUND_COLOR = (40, 40, 40)
 BORDER_COLOR = (150, 82, 25)
 BORDER_WIDTH = 25
+# number of (font file, size) pairs kept loaded at once
+FONT_CACHE_SIZE = 32
+# memory (bytes) allowed for rendered text surfaces kept around for re-use
+TEXT_CACHE_BYTES = 8 * 1024 * 1024
+# zoom levels the board can be viewed at (window pixels per board unit), the
+# mouse wheel steps through them
+ZOOM_LEVELS = (0.25, 0.35, 0.5, 0.7, 1, 1.4, 2, 2.8, 4)
+# memory (bytes) allowed for text and icons scaled to the zoom levels in use
+SCALE_CACHE_BYTES = 16 * 1024 * 1024
 # chalk color and font
 CHALK_FONT = "sfx/Chalktastic.ttf"
 CHALK_FONTSIZE = 22
+# how far (px) past the edge of a ChalkLine a click still picks it
+LINE_HIT_TOLERANCE = 3
+# how far (px) a freehand stroke may stray from the points kept of it when
+# it is simplified, and how far it reaches from where it starts (its points
+# are saved as 16 bit offsets)
+STROKE_TOLERANCE = 1.5
+STROKE_REACH = 32767
 # app color, font, dimensions
 APP_FONT = "sfx/Chalktastic.ttf"
 APP_FONTSIZE = 12
 APP_RADIUS = 45
+# where decoded app icons are cached, and the freedesktop icon themes to look in (linux)
+ICON_CACHE_DIR = "save/icons"
+ICON_THEMES = ("Adwaita", "breeze", "Papirus", "hicolor")
+# background threads extracting icons, so the board shows up before all of them are loaded
+ICON_WORKERS = 4
+# time (s) a frame spends at most turning finished icons into Surfaces, the
+# rest wait for the next frame
+ICON_PUMP_BUDGET = 0.004
+# file index answering searches: where it is kept, what it covers and what it skips
+# (absolute paths are skipped with everything below them, names are skipped anywhere)
+SEARCH_INDEX_FILE = "save/index.db"
+SEARCH_ROOTS = ("/",)
+SEARCH_EXCLUDES = ("/proc", "/sys", "/dev", "/run")
+# directory walk used until the index is built: threads listing directories,
+# most results shown per search, and how many/how often results reach the list
+SEARCH_WORKERS = 8
+SEARCH_RESULT_LIMIT = 1000
+SEARCH_BATCH = 200
+SEARCH_BATCH_INTERVAL = 0.1
+# how often (ms) the search worker checks for new queries
+SEARCH_POLL_MS = 10
+# search-as-you-type dropdown: pause (s) in typing before querying, fewest
+# characters worth querying, rows shown, their width (px) and the folder color
+SEARCH_DEBOUNCE = 0.15
+SEARCH_SUGGEST_MIN = 2
+SEARCH_SUGGESTIONS = 8
+SEARCH_DROPDOWN_WIDTH = 480
+SEARCH_DROPDOWN_DIR_COLOR = (150, 150, 150)
+# latest queries whose latencies (and final status) the search service keeps
+SEARCH_HISTORY = 100
 # options menu color and font
 OPTMENU_COLOR = (30, 30, 30)
 OPTMENU_COLOR_HOVERED = (130, 130, 130)
 OPTMENU_TEXT_COLOR = (244, 244, 244)
 OPTMENU_FONT = "sfx/OpenSans-Light.ttf"
 OPTMENU_FONTSIZE = 14
+# fonts (path, size) loaded at startup, before the board, and the time (s) from
+# main.py starting to its first frame on screen (main.py --startup shows where
+# it went)
+STARTUP_FONTS = ((CHALK_FONT, CHALK_FONTSIZE), (APP_FONT, APP_FONTSIZE), (OPTMENU_FONT, OPTMENU_FONTSIZE))
+STARTUP_TARGET = 0.5
 # color palette for blackboard items
 COLOR_PAL = [(219,96,93), (230,131,43), (248,221,93), (235, 238, 236), (99,164,108), (155,209,229)]
 NUM_COLORS = len(COLOR_PAL)
@@ -0,0 +1,426 @@
+import pygame as pg
+from pathlib import Path
+from threading import Lock, Thread
+import hashlib, mimetypes, os, queue, struct, sys, time, zlib
+
+from header import *
+from fonts import get_font
+from wakeup import wake
+
+# pixel size of the "small" and "large" icons
+ICON_SIZES = {"small": 16, "large": 32}
+
+def icon_px(size):
+    if size not in ICON_SIZES:
+        raise TypeError("Invalid argument for 'size'. Must be equal to 'small' or 'large'")
+    return ICON_SIZES[size]
+
+
+class IconProvider:
+    # a provider turns a path into (width, height, RGBA bytes), or None if it
+    # has no icon for that path; pixels (not Surfaces) so they can be cached
+    # and produced off the main thread (if threadsafe)
+    threadsafe = True
+
+    def available(self):
+        return True
+
+    def prepare(self, path, px):
+        # (loader threads, providers that aren't threadsafe only) whatever
+        # load() can do ahead of time without pygame, load() then runs on the
+        # main thread
+        pass
+
+    def load(self, path, px):
+        raise NotImplementedError
+
+
+class WindowsShellProvider(IconProvider):
+    # code modified from https://stackoverflow.com/questions/21070423/
+    def available(self):
+        return sys.platform == "win32"
+
+    def load(self, path, px):
+        from PIL import Image
+        from win32com.shell import shell
+        import pythoncom, win32api, win32con, win32ui, win32gui
+        # the shell wants COM set up on whichever thread asks for icons
+        pythoncom.CoInitialize()
+
+        SHGFI_ICON = 0x000000100
+        SHGFI_ICONLOCATION = 0x000001000
+        SHIL_SIZE = 0x00001 if px <= ICON_SIZES["small"] else 0x00002
+
+        ret, info = shell.SHGetFileInfo(os.path.abspath(path), 0, SHGFI_ICONLOCATION | SHGFI_ICON | SHIL_SIZE)
+        hIcon, iIcon, dwAttr, name, typeName = info
+        if not hIcon:
+            return None
+        ico_x = win32api.GetSystemMetrics(win32con.SM_CXICON)
+        hdc = win32ui.CreateDCFromHandle(win32gui.GetDC(0))
+        hbmp = win32ui.CreateBitmap()
+        hbmp.CreateCompatibleBitmap(hdc, ico_x, ico_x)
+        hdc = hdc.CreateCompatibleDC()
+        hdc.SelectObject(hbmp)
+        hdc.DrawIcon((0, 0), hIcon)
+        win32gui.DestroyIcon(hIcon)
+
+        bmpinfo = hbmp.GetInfo()
+        bmpstr = hbmp.GetBitmapBits(True)
+        img = Image.frombuffer(
+            "RGBA",
+            (bmpinfo["bmWidth"], bmpinfo["bmHeight"]),
+            bmpstr, "raw", "BGRA", 0, 1
+        )
+        if img.size != (px, px):
+            img = img.resize((px, px), Image.LANCZOS)
+        return img.size[0], img.size[1], img.tobytes("raw", "RGBA")
+
+
+class XDGProvider(IconProvider):
+    # freedesktop icon themes: the file's mime type (or a .desktop file's Icon=)
+    # names an icon, which is looked up in the icon theme directories; finding
+    # the icon file happens on the loader threads (prepare), decoding it makes
+    # Surfaces so it happens on the main thread (load)
+    threadsafe = False
+
+    def __init__(self, themes=ICON_THEMES):
+        self.themes = themes
+        # icon name -> [(size, file)] for every theme, built on first use
+        self.names = None
+        self.scan_lock = Lock()
+        # (path, px) -> icon files found by prepare(), not loaded yet
+        self.found = {}
+
+    def available(self):
+        return sys.platform.startswith(("linux", "freebsd", "openbsd"))
+
+    def base_dirs(self):
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        dirs = [os.path.expanduser("~/.icons"), os.path.join(data_home, "icons")]
+        dirs += [os.path.join(d, "icons") for d in data_dirs.split(":") if d]
+        return dirs
+
+    def scan(self):
+        # walk each theme once; directory names like 48x48 or 48x48@2 give the size
+        names = {}
+        for theme in self.themes:
+            for base in self.base_dirs():
+                root = os.path.join(base, theme)
+                for dirpath, dirnames, filenames in os.walk(root):
+                    size = 0
+                    for part in Path(dirpath).relative_to(root).parts:
+                        head = part.split("@")[0].split("x")[0]
+                        if head.isdigit():
+                            size = int(head)
+                        elif part == "scalable":
+                            size = -1
+                    for filename in filenames:
+                        name, ext = os.path.splitext(filename)
+                        if ext in (".png", ".svg", ".xpm"):
+                            names.setdefault(name, []).append((size, os.path.join(dirpath, filename)))
+        for pixmaps in ("/usr/share/pixmaps",):
+            if os.path.isdir(pixmaps):
+                for filename in os.listdir(pixmaps):
+                    name, ext = os.path.splitext(filename)
+                    if ext in (".png", ".svg", ".xpm"):
+                        names.setdefault(name, []).append((0, os.path.join(pixmaps, filename)))
+        self.names = names
+
+    def icon_names(self, path):
+        path = Path(path)
+        if path.suffix == ".desktop" and path.is_file():
+            with open(path, "r", errors="replace") as f:
+                for line in f:
+                    if line.startswith("Icon="):
+                        icon = line[5:].strip()
+                        return [icon] if icon else []
+        if path.is_dir():
+            return ["folder", "inode-directory"]
+        mime, _ = mimetypes.guess_type(path.name)
+        if mime is None:
+            if os.access(path, os.X_OK) and path.is_file():
+                return ["application-x-executable", "text-x-generic"]
+            return ["text-x-generic", "unknown"]
+        major = mime.split("/")[0]
+        return [mime.replace("/", "-"), major + "-x-generic", "text-x-generic", "unknown"]
+
+    def find(self, name, px):
+        # an absolute Icon= path is used as is
+        if os.path.isabs(name):
+            return name if os.path.isfile(name) else None
+        with self.scan_lock:
+            if self.names is None:
+                self.scan()
+        candidates = self.names.get(name)
+        if not candidates:
+            return None
+        # exact size first, then the smallest bigger one, then the biggest smaller one,
+        # scalable last since not every pygame build can load svg
+        def rank(entry):
+            size = entry[0]
+            if size == px:
+                return (0, 0)
+            if size > px:
+                return (1, size)
+            if size > 0:
+                return (2, -size)
+            return (3, 0)
+        return min(candidates, key=rank)[1]
+
+    def locate(self, path, px):
+        # icon files for path, best first
+        files = (self.find(name, px) for name in self.icon_names(path))
+        return [file for file in files if file is not None]
+
+    def prepare(self, path, px):
+        self.found[(path, px)] = self.locate(path, px)
+
+    def load(self, path, px):
+        files = self.found.pop((path, px), None)
+        if files is None:
+            files = self.locate(path, px)
+        for file in files:
+            try:
+                surface = pg.image.load(file)
+            except pg.error:
+                continue
+            # copy onto a 32-bit surface first, smoothscale needs one (and xpm/png
+            # files are often palettized); no convert() as there may be no display
+            rgba = pg.Surface(surface.get_size(), pg.SRCALPHA)
+            rgba.blit(surface, (0, 0))
+            if rgba.get_size() != (px, px):
+                rgba = pg.transform.smoothscale(rgba, (px, px))
+            return px, px, pg.image.tobytes(rgba, "RGBA")
+        return None
+
+
+class PlaceholderProvider(IconProvider):
+    # always has an icon: a tile colored by the file extension, with the extension on it
+    # (renders text, so only on the main thread)
+    threadsafe = False
+
+    def __init__(self):
+        # tiles only depend on the label, so each (label, size) is drawn once
+        self.tiles = {}
+
+    def load(self, path, px):
+        path = Path(path)
+        label = "dir" if path.is_dir() else (path.suffix[1:4] or "?")
+        if (label, px) in self.tiles:
+            return self.tiles[(label, px)]
+        color = COLOR_PAL[zlib.crc32(label.lower().encode()) % NUM_COLORS]
+        surface = pg.Surface((px, px), pg.SRCALPHA)
+        pg.draw.rect(surface, color, surface.get_rect(), border_radius=max(px//6, 1))
+        pg.draw.rect(surface, BACKGROUND_COLOR, surface.get_rect().inflate(-px//8, -px//8),
+                     max(px//16, 1), border_radius=max(px//8, 1))
+        text = get_font(OPTMENU_FONT, max(px//3, 6)).render(label.lower(), True, BACKGROUND_COLOR)
+        surface.blit(text, text.get_rect(center=surface.get_rect().center))
+        self.tiles[(label, px)] = px, px, pg.image.tobytes(surface, "RGBA")
+        return self.tiles[(label, px)]
+
+
+def default_providers():
+    providers = [WindowsShellProvider(), XDGProvider(), PlaceholderProvider()]
+    return [p for p in providers if p.available()]
+
+
+class IconCache:
+    def __init__(self, cache_dir, providers):
+        # icons on disk: keys/<hash of path+mtime+size> names the pixels
+        # blobs/<hash of pixels>, so identical icons are only stored once
+        self.cache_dir = cache_dir
+        self.providers = providers
+        self.dirs_made = False
+        # in memory: (path, size) -> pixel hash -> one Surface shared by every App
+        self.paths = {}
+        self.surfaces = {}
+        # counters for in-memory hits, disk hits and icons extracted by a provider
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, path, px):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = -1
+        return hashlib.sha1(("%s|%d|%d" % (path, mtime, px)).encode()).hexdigest()
+
+    def _read(self, file):
+        try:
+            with open(file, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, file, data):
+        # write to a temp file and rename, a crash never leaves half an icon behind
+        try:
+            if not self.dirs_made:
+                os.makedirs(os.path.join(self.cache_dir, "keys"), exist_ok=True)
+                os.makedirs(os.path.join(self.cache_dir, "blobs"), exist_ok=True)
+                self.dirs_made = True
+            tmp = "%s.%d.tmp" % (file, os.getpid())
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, file)
+        except OSError:
+            pass
+
+    def lookup(self, key):
+        # (pixel hash, width, height, RGBA bytes) cached on disk, or None
+        ref = self._read(os.path.join(self.cache_dir, "keys", key))
+        if ref is None:
+            return None
+        digest = ref.decode()
+        blob = self._read(os.path.join(self.cache_dir, "blobs", digest))
+        if blob is None:
+            return None
+        self.disk_hits += 1
+        w, h = struct.unpack("<II", blob[:8])
+        return digest, w, h, blob[8:]
+
+    def extract(self, key, path, px, providers):
+        # ask the providers in order and store what the first one finds, or None;
+        # safe off the main thread as long as the providers are
+        found = None
+        for provider in providers:
+            # a provider failing just means the next one gets a go
+            try:
+                found = provider.load(path, px)
+            except Exception:
+                found = None
+            if found is not None:
+                break
+        if found is None:
+            return None
+        w, h, pixels = found
+        blob = struct.pack("<II", w, h) + pixels
+        digest = hashlib.sha1(blob).hexdigest()
+        blob_file = os.path.join(self.cache_dir, "blobs", digest)
+        if not os.path.exists(blob_file):
+            self._write(blob_file, blob)
+        self._write(os.path.join(self.cache_dir, "keys", key), digest.encode())
+        return digest, w, h, pixels
+
+    def surface(self, path, px, digest, w, h, pixels):
+        # turn pixels into a Surface, re-using the one already made for the same pixels
+        self.paths[(path, px)] = digest
+        surface = self.surfaces.get(digest)
+        if surface is None:
+            surface = pg.image.frombuffer(bytes(pixels), (w, h), "RGBA")
+            self.surfaces[digest] = surface
+        return surface
+
+    def cached(self, path, px):
+        # Surface already made for this path in this session, or None
+        digest = self.paths.get((path, px))
+        if digest is None:
+            return None
+        self.hits += 1
+        return self.surfaces[digest]
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "surfaces": len(self.surfaces)}
+
+
+class IconLoader:
+    def __init__(self, cache, workers):
+        # icons are extracted by background threads; finished pixels come back
+        # through a queue and become Surfaces on the main thread in pump()
+        self.cache = cache
+        self.jobs = queue.Queue()
+        self.done = queue.Queue()
+        # (path, px) -> owners waiting for that icon, requested on the main thread
+        self.pending = {}
+        self.placeholders = {}
+        # the threads start with the first icon requested, importing this
+        # (e.g. a headless benchmark, the search worker) costs nothing
+        self.workers = workers
+        self.started = False
+
+    def placeholder(self, px):
+        # blank tile shown until the real icon arrives, one per size
+        surface = self.placeholders.get(px)
+        if surface is None:
+            surface = pg.Surface((px, px), pg.SRCALPHA)
+            pg.draw.rect(surface, EDITING_COLOR, surface.get_rect(), max(px//16, 1), border_radius=max(px//6, 1))
+            self.placeholders[px] = surface
+        return surface
+
+    def request(self, path, size, owner):
+        # returns the icon right away if it is already in memory, otherwise a
+        # placeholder, and owner.set_icon(surface) is called later by pump()
+        job = (os.path.abspath(path), icon_px(size))
+        surface = self.cache.cached(*job)
+        if surface is not None:
+            return surface
+        if job in self.pending:
+            self.pending[job].append(owner)
+        else:
+            self.pending[job] = [owner]
+            self.jobs.put(job)
+            if not self.started:
+                self.started = True
+                for i in range(self.workers):
+                    Thread(target=self._work, daemon=True).start()
+        return self.placeholder(job[1])
+
+    def _work(self):
+        threadsafe = [p for p in self.cache.providers if p.threadsafe]
+        main_thread = [p for p in self.cache.providers if not p.threadsafe]
+        while True:
+            job = self.jobs.get()
+            key = self.cache.key(*job)
+            try:
+                result = self.cache.lookup(key)
+                # a miss, once per icon (the main-thread providers are still
+                # asked in pump() when these find nothing)
+                if result is None:
+                    self.cache.misses += 1
+                    result = self.cache.extract(key, *job, threadsafe)
+                # left to pump(): do what can be done here first
+                if result is None:
+                    for provider in main_thread:
+                        provider.prepare(*job)
+            except Exception:
+                result = None
+            self.done.put((job, key, result))
+            wake()
+
+    def busy(self):
+        return bool(self.pending)
+
+    def pump(self, budget=ICON_PUMP_BUDGET):
+        # main thread: make Surfaces out of the finished icons and hand them to
+        # their owners for up to budget seconds (the main loop is woken up
+        # again for the rest), returns the owners that got a new icon
+        updated = []
+        start = time.perf_counter()
+        while True:
+            if time.perf_counter() - start > budget:
+                if not self.done.empty():
+                    wake()
+                break
+            try:
+                job, key, result = self.done.get_nowait()
+            except queue.Empty:
+                break
+            if result is None:
+                # only the main-thread providers (icon themes, placeholder) are left
+                result = self.cache.extract(key, *job, [p for p in self.cache.providers if not p.threadsafe])
+            surface = self.cache.surface(*job, *result) if result else self.placeholder(job[1])
+            for owner in self.pending.pop(job):
+                owner.set_icon(surface)
+                updated.append(owner)
+        return updated
+
+
+# one icon cache (and background loader) shared by every App
+icons = IconCache(ICON_CACHE_DIR, default_providers())
+loader = IconLoader(icons, ICON_WORKERS)
+
+def request_icon(path, size, owner):
+    return loader.request(path, size, owner)
@@ -0,0 +1,261 @@
+from threading import Thread
+import os, glob, struct, time
+
+import savefile
+from savefile import UID
+
+# journal file layout: JOURNAL_MAGIC, a version number and the generation
+# of the snapshot it follows, then one length-prefixed entry per operation:
+# an op byte, then
+#   ADD           the uid of the saved item right above it (TOP if none) and
+#                 the item's record (savefile.encode, which holds its uid)
+#   EDIT..MOVE    the item's record
+#   DELETE        its uid
+#   SWAP          its uid and the uid of the item it swapped places with
+#   PLACE         its uid and the uid of the saved item it now sits under
+#                 (TOP if none), for swaps with items that aren't saved
+JOURNAL_MAGIC = b"UIBJ"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<4sHI")
+PAIR = struct.Struct("<II")
+TOP = 0xFFFFFFFF
+
+# operations, most telling first (a change of several fields is recorded
+# as the first one that applies)
+ADD, EDIT, RESIZE, RECOLOR, MOVE, DELETE, SWAP, PLACE = range(1, 9)
+# which operation a change of each field of a record (after its kind) is
+FIELD_OPS = {
+    "ChalkText": (EDIT, MOVE, MOVE, RESIZE, RECOLOR),
+    "ChalkLine": (MOVE, MOVE, MOVE, MOVE, RESIZE, RECOLOR),
+    "App": (EDIT, MOVE, MOVE, RECOLOR, EDIT),
+    "ChalkStroke": (MOVE, MOVE, EDIT, RESIZE, RECOLOR),
+}
+
+def classify(old, new):
+    # operation turning record old into record new (either can be None)
+    if old is None:
+        return ADD
+    if new is None:
+        return DELETE
+    return min(op for op, a, b in zip(FIELD_OPS[new[0]], old[1:], new[1:]) if a != b)
+
+
+class Journal:
+    def __init__(self, snapshot_file, legacy_file, compact_ops, flush_ops, flush_interval):
+        # the board is the snapshot (see savefile) with the journals of its
+        # generation and later replayed on top; entries are buffered and
+        # written every flush_ops entries or flush_interval seconds, and the
+        # snapshot is rewritten in the background every compact_ops entries
+        self.snapshot_file = snapshot_file
+        self.legacy_file = legacy_file
+        self.compact_ops = compact_ops
+        self.flush_ops = flush_ops
+        self.flush_interval = flush_interval
+        self.generation = 0
+        self.file = None
+        self.pending = []
+        self.last_flush = time.perf_counter()
+        # entries since the snapshot, and the thread writing the next snapshot
+        self.ops = 0
+        self.compacting = None
+        # called for the (uid, record) of the board when compacting
+        self.state = None
+
+    def journal_file(self, generation):
+        return "%s.%d.journal" % (self.snapshot_file, generation)
+
+    def journals(self):
+        # (generation, file) of the journals on disk, oldest first
+        found = []
+        for file in glob.glob(glob.escape(self.snapshot_file) + ".*.journal"):
+            generation = file[len(self.snapshot_file)+1:-len(".journal")]
+            if generation.isdigit():
+                found.append((int(generation), file))
+        return sorted(found)
+
+    def read_journal(self, file):
+        # generator of the (op, uid, record, other uid) in a journal, other is
+        # the uid of the item above for ADD and PLACE (None for the top)
+        with open(file, "rb") as f:
+            header = f.read(JOURNAL_HEADER.size)
+            # a crash right after starting the journal leaves it (partly) empty
+            if len(header) < JOURNAL_HEADER.size:
+                return
+            if header[:4] != JOURNAL_MAGIC:
+                raise ValueError("%s is not a UIbb journal" % file)
+            if JOURNAL_HEADER.unpack(header)[1] > JOURNAL_VERSION:
+                raise ValueError("%s was written by a newer version of UIbb" % file)
+            for data, start in savefile.bodies(f):
+                op = data[start]
+                start += 1
+                if op == DELETE:
+                    yield op, UID.unpack_from(data, start)[0], None, None
+                elif op in (SWAP, PLACE):
+                    uid, other = PAIR.unpack_from(data, start)
+                    yield op, uid, None, (None if other == TOP else other)
+                else:
+                    other = None
+                    if op == ADD:
+                        other, = UID.unpack_from(data, start)
+                        other = None if other == TOP else other
+                        start += UID.size
+                    uid, record = savefile.decode(data, start)
+                    if record is not None:
+                        yield op, uid, record, other
+
+    def load(self):
+        # (uid, record) of the board, top-most first; the snapshot is streamed
+        # as is when there is nothing to replay on top of it
+        if os.path.exists(self.snapshot_file):
+            self.generation = savefile.board_generation(self.snapshot_file)
+        items = savefile.load_board(self.snapshot_file, self.legacy_file)
+        journals = []
+        for generation, file in self.journals():
+            # journals older than the snapshot were already folded into it
+            if generation < self.generation:
+                os.remove(file)
+            else:
+                journals.append(file)
+                self.generation = generation
+        if journals:
+            items = self.replay(items, journals)
+        self.open()
+        return items
+
+    def replay(self, items, journals):
+        # the stacking order is kept as a linked list of slots ([uid, previous,
+        # next], head is a slot above the top-most one), so every operation
+        # takes the same time however large the board is
+        head = [None, None, None]
+        head[1] = head[2] = head
+        slots, records = {}, {}
+
+        def insert(uid, above):
+            prev = slots.get(above, head)
+            slot = [uid, prev, prev[2]]
+            prev[2][1] = slot
+            prev[2] = slot
+            slots[uid] = slot
+
+        def unlink(uid):
+            slot = slots.pop(uid)
+            slot[1][2], slot[2][1] = slot[2], slot[1]
+
+        prev = head
+        for uid, record in items:
+            slot = slots[uid] = [uid, prev, head]
+            prev[2] = slot
+            prev = slot
+            records[uid] = record
+        head[1] = prev
+        for file in journals:
+            for op, uid, record, other in self.read_journal(file):
+                self.ops += 1
+                if op == DELETE:
+                    if uid in slots:
+                        unlink(uid)
+                        del records[uid]
+                elif op == SWAP:
+                    if uid in slots and other in slots:
+                        a, b = slots[uid], slots[other]
+                        a[0], b[0] = other, uid
+                        slots[uid], slots[other] = b, a
+                elif op == PLACE:
+                    if uid in slots:
+                        unlink(uid)
+                        insert(uid, other)
+                else:
+                    if uid not in slots:
+                        # an ADD, or an entry for an item this version dropped
+                        insert(uid, other if op == ADD else head[1][0])
+                    records[uid] = record
+        board, slot = [], head[2]
+        while slot is not head:
+            board.append((slot[0], records[slot[0]]))
+            slot = slot[2]
+        return board
+
+    def open(self):
+        # append to the journal of the current generation, starting it if needed
+        file = self.journal_file(self.generation)
+        os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+        if os.path.exists(file):
+            # cut off an entry a crash left half-written, new ones go after the last whole one
+            end = JOURNAL_HEADER.size
+            with open(file, "rb") as f:
+                f.seek(end)
+                for data, start in savefile.bodies(f):
+                    end += savefile.LENGTH.size + savefile.LENGTH.unpack_from(data, start - savefile.LENGTH.size)[0]
+            os.truncate(file, end if end > JOURNAL_HEADER.size else 0)
+        self.file = open(file, "ab")
+        if self.file.tell() == 0:
+            self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, self.generation))
+
+    def append(self, op, uid, record=None, other=None):
+        # other is the uid of the item swapped with for SWAP, of the item above
+        # for ADD and PLACE (None for the top)
+        if op in (ADD, PLACE):
+            other = TOP if other is None else other
+        if op == DELETE:
+            body = bytes((op,)) + UID.pack(uid)
+        elif op in (SWAP, PLACE):
+            body = bytes((op,)) + PAIR.pack(uid, other)
+        elif op == ADD:
+            body = bytes((op,)) + UID.pack(other) + savefile.encode(uid, record)
+        else:
+            body = bytes((op,)) + savefile.encode(uid, record)
+        self.pending.append(savefile.LENGTH.pack(len(body)) + body)
+        self.ops += 1
+
+    def tick(self, compact=True):
+        # called every frame: write the buffered entries once there are enough
+        # or they waited long enough, compact once the journals grew too long
+        # (unless told not to, e.g. while the board is still loading)
+        now = time.perf_counter()
+        if self.pending and (len(self.pending) >= self.flush_ops or now - self.last_flush >= self.flush_interval):
+            self.flush()
+        if compact and self.ops >= self.compact_ops and self.state is not None:
+            self.compact(self.state())
+
+    def due(self):
+        # seconds until tick() has buffered entries to write, None if there are none
+        if not self.pending:
+            return None
+        return max(0.0, self.last_flush + self.flush_interval - time.perf_counter())
+
+    def flush(self, sync=False):
+        # sync makes sure the entries reached the disk (explicit saves)
+        self.last_flush = time.perf_counter()
+        if self.pending:
+            self.file.write(b"".join(self.pending))
+            self.pending = []
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def compact(self, items):
+        # fold everything so far into a new snapshot of items (the board as
+        # journaled, taken on the caller's thread): following entries go to
+        # the journal of the next generation right away, the snapshot is
+        # written in the background and then replaces the older journals
+        if self.compacting is not None and self.compacting.is_alive():
+            return
+        self.flush()
+        self.file.close()
+        self.generation += 1
+        self.open()
+        self.ops = 0
+        self.compacting = Thread(target=self._write_snapshot, args=(list(items), self.generation))
+        self.compacting.start()
+
+    def _write_snapshot(self, items, generation):
+        savefile.write_board(self.snapshot_file, items, generation)
+        for old, file in self.journals():
+            if old < generation:
+                os.remove(file)
+
+    def close(self):
+        self.flush(sync=True)
+        self.file.close()
+        if self.compacting is not None:
+            self.compacting.join()
@@ -0,0 +1,168 @@
+import numpy as np
+
+def segment_distance2(x1, y1, x2, y2, px, py):
+    # squared distance from points (px, py) to segments (x1, y1)-(x2, y2),
+    # numbers or numpy arrays broadcast against each other
+    dx, dy = x2 - x1, y2 - y1
+    px, py = px - x1, py - y1
+    length2 = dx*dx + dy*dy
+    # projection of the point on each segment, clamped to its endpoints
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length2 > 0, (px*dx + py*dy) / length2, 0.0)
+    np.clip(t, 0.0, 1.0, out=t)
+    ex, ey = px - t*dx, py - t*dy
+    return ex*ex + ey*ey
+
+def simplify(points, tolerance):
+    # Ramer-Douglas-Peucker: keep the ends, then the point farthest from the
+    # segment between two kept points as long as it is more than tolerance
+    # away from it; returns the (x, y) points kept, in order
+    if len(points) < 3:
+        return list(points)
+    xs, ys = np.array(points, dtype=float).T
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(points) - 1)]
+    while spans:
+        first, last = spans.pop()
+        if last - first < 2:
+            continue
+        d2 = segment_distance2(xs[first], ys[first], xs[last], ys[last],
+                               xs[first+1:last], ys[first+1:last])
+        i = int(np.argmax(d2))
+        if d2[i] > tolerance * tolerance:
+            i += first + 1
+            keep[i] = True
+            spans.append((first, i))
+            spans.append((i, last))
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+class LineStore:
+    def __init__(self, capacity=256):
+        # endpoints (x1, y1, x2, y2), widths and color indices of every
+        # ChalkLine, one slot each (the ChalkLine itself only keeps its slot)
+        self.coords = np.zeros((capacity, 4))
+        self.widths = np.zeros(capacity)
+        self.colors = np.zeros(capacity, dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # slots in use are below size, freed slots get reused first
+        self.size = 0
+        self.free = []
+        # memoized answers (slot -> hit) of the last point query (a click is
+        # tested by every ChalkLine it reaches), cleared whenever a line changes
+        self.hit_pos = None
+        self.hits = {}
+
+    def __len__(self):
+        return int(self.alive[:self.size].sum())
+
+    def _grow(self):
+        capacity = len(self.widths) * 2
+        self.coords = np.resize(self.coords, (capacity, 4))
+        self.widths = np.resize(self.widths, capacity)
+        self.colors = np.resize(self.colors, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def add(self, start, end, width, color=0):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.size == len(self.widths):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.coords[slot] = (start[0], start[1], end[0], end[1])
+        self.widths[slot] = width
+        self.colors[slot] = color
+        self.alive[slot] = True
+        self.hit_pos = None
+        return slot
+
+    def remove(self, slot):
+        self.alive[slot] = False
+        self.free.append(slot)
+        self.hit_pos = None
+
+    def get_start(self, slot):
+        x, y = self.coords[slot, 0:2].tolist()
+        return (int(x), int(y))
+
+    def get_end(self, slot):
+        x, y = self.coords[slot, 2:4].tolist()
+        return (int(x), int(y))
+
+    def get_width(self, slot):
+        return int(self.widths[slot])
+
+    def get_color(self, slot):
+        return int(self.colors[slot])
+
+    def set_color(self, slot, color):
+        self.colors[slot] = color
+
+    def set_start(self, slot, pos):
+        self.coords[slot, 0:2] = pos
+        self.hit_pos = None
+
+    def set_end(self, slot, pos):
+        self.coords[slot, 2:4] = pos
+        self.hit_pos = None
+
+    def set_width(self, slot, width):
+        self.widths[slot] = width
+        self.hit_pos = None
+
+    def _slots(self, slots):
+        # the slots a query looks at: the ones given (e.g. the lines the grid
+        # found near the spot), or every slot
+        if slots is None:
+            return np.arange(self.size)
+        return np.asarray(slots, dtype=np.intp)
+
+    def mask_point(self, pos, tolerance, slots=None):
+        # which of the lines in slots pass within (half their width +
+        # tolerance) of pos: distance from the point to each segment, all at once
+        slots = self._slots(slots)
+        x1, y1, x2, y2 = self.coords[slots].T
+        reach = self.widths[slots] / 2 + tolerance
+        mask = (segment_distance2(x1, y1, x2, y2, pos[0], pos[1]) <= reach*reach) & self.alive[slots]
+        if self.hit_pos != (pos, tolerance):
+            self.hit_pos, self.hits = (pos, tolerance), {}
+        self.hits.update(zip(slots.tolist(), mask.tolist()))
+        return mask
+
+    def hit(self, slot, pos, tolerance):
+        # is the line in slot within reach of pos (answered by the last
+        # mask_point for pos when it covered slot)
+        if self.hit_pos != (pos, tolerance) or slot not in self.hits:
+            self.mask_point(pos, tolerance, [slot])
+        return self.hits[slot]
+
+    def mask_rect(self, rect, pad=0, slots=None):
+        # which of the lines in slots cross the rectangle (grown by half their
+        # width + pad), Liang-Barsky clipping of the segments all at once
+        slots = self._slots(slots)
+        n = len(slots)
+        x1, y1, x2, y2 = self.coords[slots].T
+        dx, dy = x2 - x1, y2 - y1
+        grow = self.widths[slots] / 2 + pad
+        t0, t1 = np.zeros(n), np.ones(n)
+        inside = self.alive[slots]
+        for p, q in ((-dx, x1 - (rect[0] - grow)), (dx, (rect[0] + rect[2] + grow) - x1),
+                     (-dy, y1 - (rect[1] - grow)), (dy, (rect[1] + rect[3] + grow) - y1)):
+            # parallel to this edge and outside of it
+            inside &= ~((p == 0) & (q < 0))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+        return inside & (t0 <= t1)
+
+    def query_point(self, pos, tolerance, slots=None):
+        return self._slots(slots)[self.mask_point(pos, tolerance, slots)]
+
+    def query_rect(self, rect, pad=0, slots=None):
+        return self._slots(slots)[self.mask_rect(rect, pad, slots)]
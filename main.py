@@ -1,78 +1,154 @@
+import time
+# (startup is timed from here, before the imports)
+started = time.perf_counter()
+
 import pygame as pg
+import argparse
 
 from header import *
 from bb_items import *
 from blackboard import BlackBoard
+from journal import Journal
+from wakeup import WAKEUP, wait_events
+from eventtrace import TraceRecorder
+from profiler import profiler, StartupTimer
+from fonts import fonts
 
-def load_bb(file):
-    ret = []
-    with open(file, "r") as f:
-        for line in f:
-            args = line.split(',,')
-            ret.append(args)
-    return ret
 
-def save_bb(file, items):
-    with open(file, "w") as f:
-        for item in items:
-            if isinstance(item, ChalkText) and item.text != '':
-                # this is a valid ChalkText instance, write its arguments to save file
-                args = ("ChalkText,," + item.text + ",," + str(item.x) + ",," + str(item.y)
-                        + ",," + str(item.fontsize) + ",," + str(item.color_idx) + "\n")
-                f.write(args)
-            elif isinstance(item, ChalkLine):
-                # this is a valid ChalkLine instance, write its arguments to save file
-                args = ("ChalkLine,," + str(item.start_pos[0]) + ",," + str(item.start_pos[1])
-                        + ",," + str(item.end_pos[0]) + ",," + str(item.end_pos[1]) + ",," +
-                        str(item.width) + ",," + str(item.color_idx) + "\n")
-                f.write(args)
-            elif isinstance(item, App):
-                # this is a valid App instance, write its arguments to save file
-                args = ("App,," + str(item.path) + ",," + str(item.x) + ",," +
-                        str(item.y) + ",," + str(item.color_idx) + ",," + item.name + "\n")
-                f.write(args)
+if __name__ == '__main__':
+    # --record FILE keeps the session's events (and the board it started
+    # with) in FILE, to replay with bench.py --replay FILE, --profile-log FILE
+    # appends frame metrics to FILE every PROFILE_LOG_INTERVAL seconds,
+    # --startup shows where the time to the first frame (and to the whole
+    # board loaded) went
+    parser = argparse.ArgumentParser(description="UIbb")
+    parser.add_argument("--record", metavar="FILE", help="record the session's events to FILE")
+    parser.add_argument("--profile-log", metavar="FILE", help="log frame metrics to FILE")
+    parser.add_argument("--startup", action="store_true", help="show a breakdown of the startup time")
+    args = parser.parse_args()
+    if args.profile_log:
+        profiler.open_log(args.profile_log)
 
+    # time to the first frame that takes input, and to the whole board loaded
+    # (only reported with --startup)
+    startup = StartupTimer(started)
+    startup.lap("import")
+    first_frame = None
+    reported = not args.startup
 
-if __name__ == '__main__':
-    # app window
-    pg.init()
+    # app window (only the parts of pygame UIbb uses, no audio or joysticks)
+    pg.display.init()
+    pg.font.init()
     screen = pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE)
     screen_border = pg.Rect(0, 0, WIDTH, HEIGHT)
     screen.fill(BACKGROUND_COLOR)
     pg.draw.rect(screen, BORDER_COLOR, screen_border, BORDER_WIDTH)
     pg.display.set_caption("UIbb")
+    startup.lap("window")
+    # every font the board and its menus start with, once
+    fonts.preload(STARTUP_FONTS)
+    startup.lap("fonts")
     
     # instantiate objects
     clock = pg.time.Clock()
-    bb = BlackBoard(load_bb(SAVEFILE))
+    journal = Journal(SAVEFILE, LEGACY_SAVEFILE, JOURNAL_COMPACT_OPS, JOURNAL_FLUSH_OPS, JOURNAL_FLUSH_INTERVAL)
+    board = journal.load()
+    recorder = None
+    if args.record:
+        board = list(board)
+        recorder = TraceRecorder(args.record, screen.get_size(), board)
+    startup.lap("board parse")
+    bb = BlackBoard(board, journal, LOAD_PROGRESSIVE)
+    profiler.set_view(bb.view)
+    profiler.set_search(bb.searchbar.service)
+    startup.lap("board")
 
-    # program loop
+    # program loop: event-driven, it sleeps until events come in or background
+    # work is due, otherwise it runs at FPS
     running = True
     while running:
-        for event in pg.event.get():
+        events = wait_events(bb.next_wakeup()) if EVENT_DRIVEN else pg.event.get()
+        profiler.begin_frame()
+        for event in events:
+            if recorder is not None:
+                recorder.record(event)
             # [X] to close UIbb
             if event.type == pg.QUIT:
                 running = False
+            # background work finished, it is picked up by bb.poll()
+            elif event.type == WAKEUP:
+                profiler.woke(event.sent)
             # resizing window
             elif event.type == pg.VIDEORESIZE:
                 screen = pg.display.set_mode((event.w, event.h), pg.RESIZABLE)
                 screen_border = pg.Rect(0, 0, event.w, event.h)
                 bb.searchbar.move(BORDER_WIDTH, event.h-BORDER_WIDTH-CHALK_FONTSIZE)
-            # {CTRL}+{S} to save
+                bb.resize((event.w, event.h))
+            # window contents were lost (e.g. uncovered), repaint everything
+            elif event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+                bb.expose()
+            # {CTRL}+{S} to save (edits are journaled as they happen, this makes
+            # sure they reached the disk)
             elif (event.type == pg.KEYDOWN and event.key == pg.K_s and
                   pg.key.get_mods() & pg.KMOD_CTRL):
-                save_bb(SAVEFILE, bb.items)
+                bb.save()
+            # {F3} to show/hide the frame profiler
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                profiler.toggle_overlay()
+                bb.expose()
             else:
                 bb.handle_event(event)
+        if recorder is not None:
+            recorder.frame()
+        profiler.lap("events")
+        # pick up icons loaded in the background, write out the journal
+        bb.poll()
+        profiler.lap("poll")
                 
-        # re-draw blackboard
-        screen.fill(BACKGROUND_COLOR)
-        bb.draw(screen)
-        pg.draw.rect(screen, BORDER_COLOR, screen_border, BORDER_WIDTH)
-        # update display
-        pg.display.update()
-        clock.tick(FPS)
+        if DIRTY_RECTS:
+            # re-draw only the damaged regions, nothing to flip on idle frames
+            rects = bb.draw_dirty(screen)
+            profiler.lap("draw")
+            if rects:
+                pg.draw.rect(screen, BORDER_COLOR, screen_border, BORDER_WIDTH)
+                # the profiler's overlay goes over everything (it's redrawn
+                # whole, {F3} repaints the board once it's hidden)
+                if profiler.overlay:
+                    rects.append(profiler.draw(screen))
+                    profiler.lap("overlay")
+                pg.display.update(rects)
+                profiler.lap("flip")
+            profiler.end_frame(bool(rects))
+        else:
+            # re-draw blackboard
+            screen.fill(BACKGROUND_COLOR)
+            bb.draw(screen)
+            pg.draw.rect(screen, BORDER_COLOR, screen_border, BORDER_WIDTH)
+            profiler.lap("draw")
+            if profiler.overlay:
+                profiler.draw(screen)
+                profiler.lap("overlay")
+            # update display
+            pg.display.update()
+            profiler.lap("flip")
+            profiler.end_frame(True)
+        # report how long the board took to take input, and to be complete
+        # (--startup)
+        if first_frame is None:
+            first_frame = time.perf_counter() - started
+            startup.lap("first frame")
+            if args.startup:
+                print(startup.report(STARTUP_TARGET))
+        if not reported and not bb.loading():
+            reported = True
+            print("UIbb: first interactive frame after %.0f ms, %d items loaded after %.0f ms" % (
+                first_frame * 1000, len(bb.items), (time.perf_counter() - started) * 1000))
+        clock.tick(FPS_ACTIVE if EVENT_DRIVEN else FPS)
 
-    # program exit, save blackboard
-    save_bb(SAVEFILE, bb.items)
+    # program exit, save blackboard (waits for a compaction still running)
+    if recorder is not None:
+        recorder.close()
+    profiler.close()
+    journal.close()
+    bb.searchbar.service.close()
     pg.quit()
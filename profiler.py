@@ -0,0 +1,245 @@
+import pygame as pg
+from collections import deque
+import bisect, json, os, time
+
+from header import *
+import fonts
+import icons
+
+class FrameProfiler:
+    def __init__(self, frames, log_interval, log_bytes):
+        # off unless the overlay is shown or a metrics log is open: the hooks
+        # then only check enabled (set when a frame begins, so a frame is
+        # either timed as a whole or not at all)
+        self.enabled = False
+        self.overlay = False
+        self.log = None
+        self.log_file = None
+        self.log_interval = log_interval
+        self.log_bytes = log_bytes
+        self.logged_at = time.perf_counter()
+        self.cpu_logged = time.process_time()
+        # this frame: when it started (and the last lap), seconds spent in each
+        # phase, and items drawn and seconds drawing them by item type
+        self.started = self.lap_at = 0
+        self.phases = {}
+        self.draws = {}
+        self.draw_time = {}
+        self.text_time = 0
+        # the last frames as (seconds, phases, draws, draw_time), for the
+        # overlay, and the ones since the last line of the metrics log
+        self.frames = deque(maxlen=frames)
+        self.unlogged = []
+        # seconds from wake() to the main loop taking each of the last WAKEUP
+        # events (see wakeup.wake)
+        self.wakeups = deque(maxlen=frames)
+        # the view's cache of scaled text and icons (see set_view), the search
+        # service (see set_search), and where the overlay was drawn last
+        self.view_cache = None
+        self.search = None
+        self.rect = None
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+
+    def open_log(self, file):
+        # one JSON line of metrics every log_interval seconds, file is moved
+        # to file.1 once it grows past log_bytes
+        self.log_file = file
+        self.log = open(file, "a")
+
+    def close(self):
+        if self.log is not None:
+            self.write_log()
+            self.log.close()
+            self.log = None
+
+    def begin_frame(self):
+        self.enabled = self.overlay or self.log is not None
+        if not self.enabled:
+            return
+        self.started = self.lap_at = time.perf_counter()
+        self.phases = {}
+        self.draws = {}
+        self.draw_time = {}
+        self.text_time = fonts.texts.render_time
+
+    def lap(self, name):
+        # the time since the last lap (or the frame began) was spent in phase name
+        if self.enabled:
+            now = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0) + now - self.lap_at
+            self.lap_at = now
+
+    def now(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def add(self, name, start):
+        # the time since start (from now()) was spent in phase name, which is
+        # part of a lap (e.g. baking is part of drawing)
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def drew(self, item, start):
+        # item was drawn, starting at start (from now())
+        kind = type(item).__name__
+        self.draws[kind] = self.draws.get(kind, 0) + 1
+        self.draw_time[kind] = self.draw_time.get(kind, 0) + time.perf_counter() - start
+
+    def woke(self, sent):
+        # a WAKEUP event sent (perf_counter) then was taken now
+        if self.enabled:
+            self.wakeups.append(time.perf_counter() - sent)
+
+    def wakeup_stats(self):
+        # wakeup latency (ms) over the last WAKEUP events, median and worst
+        times = sorted(self.wakeups)
+        n = len(times)
+        return {"count": n, "p50_ms": times[n // 2] * 1000 if n else 0,
+                "max_ms": times[-1] * 1000 if n else 0, "target_ms": WAKEUP_TARGET * 1000}
+
+    def end_frame(self, drawn):
+        # frames that drew nothing (e.g. only background work) are not kept
+        if not self.enabled or not drawn:
+            return
+        # text rendered (cache misses) anywhere in the frame
+        self.phases["text render"] = fonts.texts.render_time - self.text_time
+        frame = (time.perf_counter() - self.started, self.phases, self.draws, self.draw_time)
+        self.frames.append(frame)
+        if self.log is not None:
+            self.unlogged.append(frame)
+            if time.perf_counter() - self.logged_at >= self.log_interval:
+                self.write_log()
+
+    def summary(self, frames):
+        # frame time percentiles, mean time per phase and per item type (ms)
+        # and items drawn per frame over frames
+        times = sorted(frame[0] for frame in frames)
+        n = len(times)
+        phases, draws, draw_time = {}, {}, {}
+        for seconds, frame_phases, frame_draws, frame_draw_time in frames:
+            for name, value in frame_phases.items():
+                phases[name] = phases.get(name, 0) + value
+            for kind, value in frame_draws.items():
+                draws[kind] = draws.get(kind, 0) + value
+                draw_time[kind] = draw_time.get(kind, 0) + frame_draw_time[kind]
+        return {"frames": n,
+                "p50_ms": times[n // 2] * 1000 if n else 0,
+                "p99_ms": times[min(n - 1, n * 99 // 100)] * 1000 if n else 0,
+                "max_ms": times[-1] * 1000 if n else 0,
+                "phases_ms": {name: value / n * 1000 for name, value in phases.items()},
+                "draws": {kind: value / n for kind, value in draws.items()},
+                "draw_ms": {kind: value / n * 1000 for kind, value in draw_time.items()}}
+
+    def caches(self):
+        # hit rate of the font registry, the text cache, icons in memory and
+        # text/icons scaled for the zoom (the view's cache, see set_view)
+        found = {}
+        for name, cache in (("fonts", fonts.fonts), ("text", fonts.texts), ("icons", icons.icons),
+                            ("zoom", self.view_cache)):
+            if cache is not None:
+                stats = cache.stats()
+                asked = stats["hits"] + stats["misses"]
+                found[name] = stats["hits"] / asked if asked else 1.0
+        return found
+
+    def set_view(self, view):
+        self.view_cache = view.cache
+
+    def set_search(self, service):
+        self.search = service
+
+    def write_log(self):
+        # (the CPU share covers idle time too, when no frames were drawn)
+        now, cpu = time.perf_counter(), time.process_time()
+        line = {"time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        line.update(self.summary(self.unlogged))
+        line["cpu_pct"] = (cpu - self.cpu_logged) / max(now - self.logged_at, 1e-9) * 100
+        line["wakeup"] = self.wakeup_stats()
+        line["caches"] = self.caches()
+        if self.search is not None:
+            line["search"] = self.search.stats()
+        self.log.write(json.dumps(rounded(line)) + "\n")
+        self.log.flush()
+        self.unlogged = []
+        self.logged_at, self.cpu_logged = now, cpu
+        if self.log.tell() > self.log_bytes:
+            self.log.close()
+            os.replace(self.log_file, self.log_file + ".1")
+            self.log = open(self.log_file, "a")
+
+    def draw(self, screen):
+        # overlay in the top left corner of the window: frame time histogram
+        # and percentiles, then where the time goes, returns the area it covers
+        font = fonts.get_font(OPTMENU_FONT, OPTMENU_FONTSIZE)
+        stats = self.summary(self.frames)
+        lines = ["frame p50 %.1f ms  p99 %.1f ms  max %.1f ms  (%d frames)" % (
+            stats["p50_ms"], stats["p99_ms"], stats["max_ms"], stats["frames"])]
+        lines.append("ms/frame  " + "  ".join("%s %.2f" % item for item in sorted(stats["phases_ms"].items())))
+        lines.append("drawn/frame  " + "  ".join("%s %.1f in %.2f ms" % (kind, stats["draws"][kind], stats["draw_ms"][kind])
+                                                 for kind in sorted(stats["draws"])))
+        lines.append("hits  " + "  ".join("%s %.0f%%" % (name, rate * 100) for name, rate in self.caches().items()))
+        wakeup = self.wakeup_stats()
+        lines.append("wakeup p50 %.1f ms  max %.1f ms  (target %.0f ms, %d wakeups)" % (
+            wakeup["p50_ms"], wakeup["max_ms"], wakeup["target_ms"], wakeup["count"]))
+        if self.search is not None:
+            lines.append("latency p50  " + "  ".join("%s %.0f ms (of %d)" % (name, stats["p50_ms"], stats["count"])
+                                                     for name, stats in self.search.stats().items()))
+        line_h = font.get_linesize()
+        width = max(font.size(line)[0] for line in lines) + 20
+        rect = pg.Rect(BORDER_WIDTH + 10, BORDER_WIDTH + 10, max(width, 300), PROFILE_HISTOGRAM_HEIGHT + line_h * len(lines) + 20)
+        # (never shrinks, what it covered before would be left over)
+        if self.rect is not None:
+            rect.union_ip(self.rect)
+        screen.fill(OPTMENU_COLOR, rect)
+        # frames per bucket of frame time, labeled with the longest (ms) in it
+        buckets = [0] * (len(PROFILE_BUCKETS) + 1)
+        for frame in self.frames:
+            buckets[bisect.bisect_left(PROFILE_BUCKETS, frame[0] * 1000)] += 1
+        labels = ["%g" % bound for bound in PROFILE_BUCKETS] + [">%g" % PROFILE_BUCKETS[-1]]
+        most = max(buckets) or 1
+        bar_w = (rect.w - 20) // len(buckets)
+        base = rect.y + 10 + PROFILE_HISTOGRAM_HEIGHT - line_h
+        for i, count in enumerate(buckets):
+            h = count * (PROFILE_HISTOGRAM_HEIGHT - line_h - 5) // most
+            bar = pg.Rect(rect.x + 10 + i * bar_w, base - h, bar_w - 2, h)
+            pg.draw.rect(screen, OPTMENU_COLOR_HOVERED, bar)
+            screen.blit(font.render(labels[i], True, OPTMENU_TEXT_COLOR), (bar.x, base))
+        y = rect.y + 10 + PROFILE_HISTOGRAM_HEIGHT
+        for line in lines:
+            screen.blit(font.render(line, True, OPTMENU_TEXT_COLOR), (rect.x + 10, y))
+            y += line_h
+        self.rect = rect
+        return rect
+
+
+class StartupTimer:
+    def __init__(self, started):
+        # seconds spent in each phase of startup (in order), counted from started
+        self.started = self.lap_at = started
+        self.phases = []
+
+    def lap(self, name):
+        # the time since the last lap (or started) was spent in phase name
+        now = time.perf_counter()
+        self.phases.append((name, now - self.lap_at))
+        self.lap_at = now
+
+    def report(self, target):
+        total = self.lap_at - self.started
+        lines = ["UIbb: first frame after %.0f ms (target %.0f ms%s)" % (
+            total * 1000, target * 1000, ", missed" if total > target else "")]
+        for name, seconds in self.phases:
+            lines.append("  %-11s %6.1f ms" % (name, seconds * 1000))
+        return "\n".join(lines)
+
+
+def rounded(value):
+    # (numbers in the metrics log to the microsecond)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    return round(value, 3) if isinstance(value, float) else value
+
+
+# one profiler for the main loop and the board
+profiler = FrameProfiler(PROFILE_FRAMES, PROFILE_LOG_INTERVAL, PROFILE_LOG_BYTES)
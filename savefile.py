@@ -0,0 +1,185 @@
+import os, struct, tempfile
+
+# save file layout: MAGIC, a version number and (from version 2) the
+# generation of the snapshot, then one length-prefixed record per item
+# (u32 length, then the record: a kind byte, from version 2 the item's
+# uid, and its fields); strings are utf-8 with a u32 length, so any text
+# round-trips as is. Journals (see journal) pair with a generation.
+MAGIC = b"UIBB"
+VERSION = 2
+HEADER = struct.Struct("<4sH")
+GENERATION = struct.Struct("<I")
+LENGTH = struct.Struct("<I")
+UID = struct.Struct("<I")
+# bytes read from the file at a time when loading
+CHUNK = 1 << 20
+
+# fields of each kind of record, besides its strings and points (a kind
+# added later is skipped by older versions, see decode)
+CHALKTEXT, CHALKLINE, APP, CHALKSTROKE = 1, 2, 3, 4
+KINDS = {"ChalkText": CHALKTEXT, "ChalkLine": CHALKLINE, "App": APP, "ChalkStroke": CHALKSTROKE}
+FIELDS = {
+    CHALKTEXT: struct.Struct("<iiHB"),     # x, y, fontsize, color, then the text
+    CHALKLINE: struct.Struct("<iiiiHB"),   # start x, y, end x, y, width, color
+    APP: struct.Struct("<iiB"),            # x, y, color, then the path and name
+    CHALKSTROKE: struct.Struct("<iiHBI"),  # x, y, width, color, number of points,
+                                           # then the points as i16 offsets from x, y
+}
+
+
+def _pack_str(text):
+    data = text.encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+def _unpack_str(data, offset):
+    n, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    return data[offset:offset+n].decode("utf-8"), offset + n
+
+def encode(uid, record):
+    # record is a tuple as returned by the items' record(), e.g.
+    # ("ChalkText", text, x, y, fontsize, color)
+    kind = KINDS[record[0]]
+    if kind == CHALKTEXT:
+        text, x, y, fontsize, color = record[1:]
+        body = FIELDS[kind].pack(x, y, fontsize, color) + _pack_str(text)
+    elif kind == CHALKLINE:
+        body = FIELDS[kind].pack(*record[1:])
+    elif kind == CHALKSTROKE:
+        x, y, points, width, color = record[1:]
+        body = FIELDS[kind].pack(x, y, width, color, len(points) // 2) + struct.pack("<%dh" % len(points), *points)
+    else:
+        path, x, y, color, name = record[1:]
+        body = FIELDS[kind].pack(x, y, color) + _pack_str(path) + _pack_str(name)
+    return bytes((kind,)) + UID.pack(uid) + body
+
+def decode(data, offset=0, has_uid=True):
+    # (uid, record) starting at offset in data, the record is None for kinds
+    # this version doesn't know (written by a newer one); uid is None if the
+    # record doesn't hold one (version 1)
+    kind = data[offset]
+    offset += 1
+    uid = None
+    if has_uid:
+        uid, = UID.unpack_from(data, offset)
+        offset += UID.size
+    fields = FIELDS.get(kind)
+    if fields is None:
+        return uid, None
+    values = fields.unpack_from(data, offset)
+    offset += fields.size
+    if kind == CHALKTEXT:
+        text, offset = _unpack_str(data, offset)
+        return uid, ("ChalkText", text) + values
+    elif kind == CHALKLINE:
+        return uid, ("ChalkLine",) + values
+    elif kind == CHALKSTROKE:
+        x, y, width, color, n = values
+        points = struct.unpack_from("<%dh" % (2*n), data, offset)
+        return uid, ("ChalkStroke", x, y, points, width, color)
+    path, offset = _unpack_str(data, offset)
+    name, offset = _unpack_str(data, offset)
+    return uid, ("App", path) + values + (name,)
+
+
+def write_atomic(file, header, bodies):
+    # write header and the length-prefixed bodies to a temporary file next
+    # to file, then swap it in, so a crash never leaves a half-written file
+    folder = os.path.dirname(file) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".save-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            chunk = []
+            for body in bodies:
+                chunk.append(LENGTH.pack(len(body)) + body)
+                if len(chunk) >= 1024:
+                    f.write(b"".join(chunk))
+                    chunk = []
+            f.write(b"".join(chunk))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, file)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def write_board(file, items, generation=0):
+    # items is an iterable of (uid, record), top-most first
+    header = HEADER.pack(MAGIC, VERSION) + GENERATION.pack(generation)
+    write_atomic(file, header, (encode(uid, record) for uid, record in items))
+
+def bodies(f):
+    # generator of (data, start) for every length-prefixed body left in f,
+    # cut out of 1MB chunks (a body split across two chunks is carried over);
+    # a body cut short at the end of the file is dropped
+    data, offset = b"", 0
+    while True:
+        chunk = f.read(CHUNK)
+        if not chunk:
+            return
+        data = data[offset:] + chunk
+        offset = 0
+        while offset + LENGTH.size <= len(data):
+            n, = LENGTH.unpack_from(data, offset)
+            end = offset + LENGTH.size + n
+            if end > len(data):
+                break
+            yield data, offset + LENGTH.size
+            offset = end
+
+def read_header(f, file):
+    # (version, generation) of an open save file
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:4] != MAGIC:
+        raise ValueError("%s is not a UIbb save file" % file)
+    magic, version = HEADER.unpack(header)
+    if version > VERSION:
+        raise ValueError("%s was saved by a newer version of UIbb (format %d)" % (file, version))
+    generation = 0
+    if version >= 2:
+        generation, = GENERATION.unpack(f.read(GENERATION.size))
+    return version, generation
+
+def read_board(file):
+    # generator of the (uid, record) in a save file, one at a time (records
+    # of version 1 files are numbered in order)
+    with open(file, "rb") as f:
+        version, generation = read_header(f, file)
+        for i, (data, start) in enumerate(bodies(f)):
+            uid, record = decode(data, start, version >= 2)
+            if record is not None:
+                yield (i if uid is None else uid), record
+
+def board_generation(file):
+    with open(file, "rb") as f:
+        return read_header(f, file)[1]
+
+def read_legacy(file):
+    # generator of the (uid, record) in an old ",,"-delimited save.csv, lines
+    # that can't be parsed (e.g. split by a newline inside a text) are skipped
+    with open(file, "r") as f:
+        for uid, line in enumerate(f):
+            args = line.rstrip("\n").split(",,")
+            try:
+                if args[0] == "ChalkText":
+                    # a text holding ",," was split into several fields
+                    x, y, fontsize, color = map(int, args[-4:])
+                    yield uid, ("ChalkText", ",,".join(args[1:-4]), x, y, fontsize, color)
+                elif args[0] == "ChalkLine":
+                    yield uid, ("ChalkLine",) + tuple(map(int, args[1:7]))
+                elif args[0] == "App":
+                    x, y, color = map(int, args[2:5])
+                    yield uid, ("App", args[1], x, y, color, ",,".join(args[5:]).strip())
+            except (ValueError, IndexError):
+                continue
+
+def load_board(file, legacy_file=None):
+    # (uid, record) of the board saved in file, or of the old save.csv if
+    # there is no new save yet (the next compaction then writes the new format)
+    if os.path.exists(file):
+        return read_board(file)
+    if legacy_file is not None and os.path.exists(legacy_file):
+        return read_legacy(legacy_file)
+    return iter(())
@@ -0,0 +1,160 @@
+from PyQt5.QtCore import pyqtSignal, QTimer
+from PyQt5.QtWidgets import QApplication, QDialog, QLabel, QListWidget, QVBoxLayout
+from threading import Thread, Event
+import sys, time
+
+from header import *
+from fileindex import FileIndex
+from walker import ParallelWalker
+
+class SearchGUI(QDialog):
+    # batches of paths and the closing status line of a query, emitted by the
+    # search thread and delivered on the GUI thread
+    found = pyqtSignal(int, list)
+    search_done = pyqtSignal(int, str)
+
+    def __init__(self, index, events):
+        # QDialog widget, one for the whole session, hidden between searches
+        super(SearchGUI, self).__init__()
+        self.setStyleSheet("background-color: rgb(30, 30, 30);")
+        self.index = index
+        # queue back to the board: picks and the progress of each query
+        self.events = events
+        # query being shown, set cancel to stop its search
+        self.query_id = 0
+        self.cancel = Event()
+        self.first_shown = False
+        # contains a list widget to display the search results
+        self.list_widget = QListWidget()
+        self.list_widget.setStyleSheet("color: rgb(211, 211, 211);")
+        self.list_widget.setFixedHeight(600)
+        self.list_widget.setMinimumWidth(400)
+        self.list_widget.itemDoubleClicked.connect(self.addAndReturn)
+        # status line below the list: progress, then result count and scan speed
+        self.status = QLabel("Searching...")
+        self.status.setStyleSheet("color: rgb(150, 150, 150);")
+        # list widget sits on top of layout
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.list_widget)
+        layout.addWidget(self.status)
+        self.found.connect(self.addItems)
+        self.search_done.connect(self.showStatus)
+
+    def start(self, query_id, file):
+        # stop the previous search and show this one
+        self.cancel.set()
+        self.cancel = Event()
+        self.query_id = query_id
+        self.first_shown = False
+        self.list_widget.clear()
+        self.status.setText("Searching...")
+        self.setWindowTitle(file)
+        Thread(target=self.searchItems, args=(query_id, file, self.cancel), daemon=True).start()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def searchItems(self, query_id, file, cancel):
+        # runs on its own thread: answer from the file index once it has been
+        # built, else walk the disk; results reach the list through signals
+        emit = lambda batch: self.found.emit(query_id, batch)
+        if self.index.ready():
+            start, batch, count = time.perf_counter(), [], 0
+            for path in self.index.search(file, SEARCH_RESULT_LIMIT):
+                if cancel.is_set():
+                    break
+                batch.append(path)
+                count += 1
+                # the first result goes out on its own, so it shows up right away
+                if count == 1 or len(batch) >= SEARCH_BATCH:
+                    emit(batch)
+                    batch = []
+            if batch:
+                emit(batch)
+            status = "%d results from the index in %.0f ms" % (count, (time.perf_counter() - start) * 1000)
+            limited = count >= SEARCH_RESULT_LIMIT
+        else:
+            walker = ParallelWalker(self.index.roots, file, self.index.excluded, SEARCH_WORKERS,
+                                    SEARCH_RESULT_LIMIT, SEARCH_BATCH, SEARCH_BATCH_INTERVAL)
+            walker.run(emit, cancel)
+            status = "%d results, %d files scanned in %.1f s (%d files/s)" % (
+                walker.found, walker.scanned, walker.elapsed(), walker.rate())
+            limited = walker.limited
+        if limited:
+            status += ", showing the first %d" % SEARCH_RESULT_LIMIT
+        elif cancel.is_set():
+            status += ", cancelled"
+        self.search_done.emit(query_id, status)
+
+    def addItems(self, query_id, paths):
+        # batches of a replaced query may still be in flight, drop them
+        if query_id != self.query_id:
+            return
+        self.list_widget.addItems(paths)
+        if not self.first_shown:
+            self.first_shown = True
+            self.events.put(("first_result", query_id))
+
+    def showStatus(self, query_id, status):
+        if query_id != self.query_id:
+            return
+        self.status.setText(status)
+        self.events.put(("done", query_id, status))
+
+    def addAndReturn(self, item):
+        # hands the pick to the board and hides until the next search
+        self.events.put(("pick", item.text()))
+        self.hide()
+
+    def done(self, result):
+        # closing, escaping or picking ends the search
+        self.cancel.set()
+        super(SearchGUI, self).done(result)
+
+    def hideEvent(self, event):
+        self.cancel.set()
+        super(SearchGUI, self).hideEvent(event)
+
+
+def serve(conn, events, index_file, roots, excludes):
+    # search worker process: one QApplication and one search window for the
+    # whole session; commands from the board arrive on conn and are polled
+    # from the Qt event loop, so Qt only ever runs on this process' main thread
+    app = QApplication(sys.argv)
+    app.setQuitOnLastWindowClosed(False)
+    index = FileIndex(index_file, roots, excludes)
+    index.refresh_async()
+    window = SearchGUI(index, events)
+    # set to stop the suggest query being ranked
+    suggesting = [Event()]
+
+    def suggest(query_id, text, cancel):
+        # ranks on its own thread, the answer is dropped if a newer query came in
+        paths = index.suggest(text, SEARCH_SUGGESTIONS, cancel) if index.ready() else []
+        if not cancel.is_set():
+            events.put(("suggestions", query_id, paths))
+
+    def poll():
+        while conn.poll():
+            try:
+                command = conn.recv()
+            except EOFError:
+                # the board went away
+                command = ("quit",)
+            if command[0] == "search":
+                window.start(command[1], command[2])
+            elif command[0] == "suggest":
+                suggesting[0].set()
+                suggesting[0] = Event()
+                Thread(target=suggest, args=(command[1], command[2], suggesting[0]), daemon=True).start()
+            elif command[0] == "refresh":
+                index.refresh_async()
+            elif command[0] == "quit":
+                app.quit()
+                return
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(SEARCH_POLL_MS)
+    events.put(("ready",))
+    app.exec_()
@@ -0,0 +1,138 @@
+from collections import deque
+from queue import Empty, Queue
+from threading import Thread
+import time
+
+def _serve(*args):
+    # entry point of the worker process, Qt is only ever imported there
+    import searchgui
+    searchgui.serve(*args)
+
+
+class SearchService:
+    def __init__(self, index_file, roots, excludes, wake=None, history=100):
+        # search worker process, started on first use and kept for the session
+        self.args = (index_file, roots, excludes)
+        self.process = None
+        # commands go out on conn, picks and query progress come back on events;
+        # a thread moves them to inbox as they arrive and calls wake() (if any)
+        # so a main loop waiting for input knows to poll()
+        self.conn = None
+        self.events = None
+        self.inbox = Queue()
+        self.wake = wake
+        # time each query was sent, and the seconds it took each one to show
+        # its first result (Enter to first result, as seen by the board) and
+        # how it ended, for the last history queries
+        self.history = history
+        self.query_id = 0
+        self.sent = {}
+        self.latencies = deque(maxlen=history)
+        self.statuses = {}
+        # search-as-you-type: only the answer to the newest suggest query is
+        # kept (None until a new one arrives), and how long each one took
+        self.suggest_id = 0
+        self.suggest_sent = None
+        self.suggestions = None
+        self.suggest_latencies = deque(maxlen=history)
+        # paths picked in the results window, not handed out yet
+        self.picked = []
+
+    def start(self):
+        # (re)start the worker if it is not running
+        if self.process is None or not self.process.is_alive():
+            # (not imported before the board needs search, it slows startup)
+            import multiprocessing as mp
+            ctx = mp.get_context("spawn")
+            self.conn, child = ctx.Pipe()
+            self.events = ctx.Queue()
+            self.process = ctx.Process(target=_serve, args=(child, self.events) + self.args, daemon=True)
+            self.process.start()
+            Thread(target=self._relay, args=(self.events,), daemon=True).start()
+
+    def _relay(self, events):
+        while True:
+            try:
+                event = events.get()
+            except (EOFError, OSError):
+                return
+            self.inbox.put(event)
+            if self.wake is not None:
+                self.wake()
+
+    def refresh(self):
+        # start the worker early and have it bring its index up to date
+        self.start()
+        self.conn.send(("refresh",))
+
+    def search(self, text):
+        self.start()
+        self.query_id += 1
+        self.sent[self.query_id] = time.perf_counter()
+        self.conn.send(("search", self.query_id, text))
+        return self.query_id
+
+    def suggest(self, text):
+        # rank the index against text in the worker, replacing any query still running
+        self.start()
+        self.suggest_id += 1
+        self.suggest_sent = time.perf_counter()
+        self.conn.send(("suggest", self.suggest_id, text))
+
+    def drop_suggestions(self):
+        # forget the query in flight, its answer will be ignored
+        self.suggest_id += 1
+
+    def take_suggestions(self):
+        # newest suggestions (a list of paths) since the last call, or None
+        suggestions, self.suggestions = self.suggestions, None
+        return suggestions
+
+    def picks(self):
+        # paths picked in the results window since the last call
+        self.poll()
+        picks, self.picked = self.picked, []
+        return picks
+
+    def poll(self):
+        # drain the events from the worker
+        while True:
+            try:
+                event = self.inbox.get_nowait()
+            except Empty:
+                return
+            if event[0] == "pick":
+                self.picked.append(event[1])
+            elif event[0] == "suggestions":
+                if event[1] == self.suggest_id:
+                    self.suggestions = event[2]
+                    self.suggest_latencies.append(time.perf_counter() - self.suggest_sent)
+            elif event[0] == "first_result":
+                sent = self.sent.pop(event[1], None)
+                if sent is not None:
+                    self.latencies.append(time.perf_counter() - sent)
+            elif event[0] == "done":
+                self.sent.pop(event[1], None)
+                self.statuses[event[1]] = event[2]
+                if len(self.statuses) > self.history:
+                    del self.statuses[next(iter(self.statuses))]
+
+    def stats(self):
+        # Enter to first result and keystroke to suggestions (ms) over the
+        # last history queries, median and worst
+        found = {}
+        for name, latencies in (("search", self.latencies), ("suggest", self.suggest_latencies)):
+            times = sorted(latencies)
+            n = len(times)
+            found[name] = {"count": n,
+                           "p50_ms": times[n // 2] * 1000 if n else 0,
+                           "max_ms": times[-1] * 1000 if n else 0}
+        return found
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.conn.send(("quit",))
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
@@ -0,0 +1,71 @@
+import pygame as pg
+
+class SpatialGrid:
+    def __init__(self, cell_size):
+        # uniform grid: each cell (cx, cy) lists the items whose rect overlaps it
+        # (lists, most cells hold an item or two and a set costs several times more)
+        self.cell_size = cell_size
+        self.cells = {}
+        # rect of every item in the grid (the cells it covers are worked out
+        # again from it, keeping them per item would cost more than the rect)
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, item):
+        return item in self.rects
+
+    def _cells(self, rect):
+        # keys of all the cells a rectangle overlaps
+        size = self.cell_size
+        x0, y0 = rect.left // size, rect.top // size
+        x1, y1 = (rect.right - 1) // size, (rect.bottom - 1) // size
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def insert(self, item, rect):
+        rect = pg.Rect(rect)
+        for key in self._cells(rect):
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = cell = []
+            cell.append(item)
+        self.rects[item] = rect
+
+    def remove(self, item):
+        if item not in self.rects:
+            return
+        for key in self._cells(self.rects[item]):
+            cell = self.cells[key]
+            cell.remove(item)
+            if not cell:
+                del self.cells[key]
+        del self.rects[item]
+
+    def update(self, item, rect):
+        # only touch the grid if the item actually moved or changed size
+        old = self.rects.get(item)
+        if old is not None and old == rect:
+            return
+        self.remove(item)
+        self.insert(item, rect)
+
+    def query_point(self, pos):
+        # items whose rect contains pos
+        size = self.cell_size
+        cell = self.cells.get((int(pos[0]) // size, int(pos[1]) // size))
+        if not cell:
+            return set()
+        rects = self.rects
+        return {item for item in cell if rects[item].collidepoint(pos)}
+
+    def query_rect(self, rect):
+        # items whose rect overlaps the given rect
+        rect = pg.Rect(rect)
+        found = set()
+        for key in self._cells(rect):
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+        rects = self.rects
+        return {item for item in found if rects[item].colliderect(rect)}
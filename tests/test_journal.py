@@ -0,0 +1,123 @@
+import threading
+
+import journal as journal_module
+import savefile
+from journal import Journal, ADD, EDIT, MOVE, DELETE, SWAP
+
+def text(name, x=0):
+    return ("ChalkText", name, x, 0, 22, 3)
+
+def open_journal(tmp_path, compact_ops=1000):
+    # entries are written as soon as they come in
+    j = Journal(str(tmp_path / "save.uibb"), str(tmp_path / "save.csv"), compact_ops, 1, 0)
+    return j, list(j.load())
+
+def crash(j):
+    # what reached the file stays there, nothing else happens (no sync, no
+    # waiting for a compaction)
+    j.flush()
+    j.file.close()
+
+def fill(j):
+    # a board of c (top), b, then a once replayed
+    j.append(ADD, 1, text("a"))
+    j.append(ADD, 2, text("b"))
+    j.append(ADD, 3, text("c"))
+    j.append(EDIT, 2, text("b2"))
+    j.append(MOVE, 1, text("a", 50))
+    j.append(SWAP, 3, other=2)
+    j.tick()
+
+def test_replay_after_crash(tmp_path):
+    j, board = open_journal(tmp_path)
+    assert board == []
+    fill(j)
+    j.append(DELETE, 1)
+    j.tick()
+    crash(j)
+    j, board = open_journal(tmp_path)
+    assert board == [(2, text("b2")), (3, text("c"))]
+    j.close()
+
+def test_crash_before_the_snapshot_is_written(tmp_path, monkeypatch):
+    # the journal of the next generation was started, the snapshot never made it
+    j, board = open_journal(tmp_path)
+    fill(j)
+    monkeypatch.setattr(j, "_write_snapshot", lambda items, generation: None)
+    j.compact([(2, text("b2")), (3, text("c")), (1, text("a", 50))])
+    j.append(DELETE, 3)
+    j.tick()
+    crash(j)
+    j, board = open_journal(tmp_path)
+    assert board == [(2, text("b2")), (1, text("a", 50))]
+    j.close()
+
+def test_crash_before_old_journals_are_removed(tmp_path, monkeypatch):
+    # the snapshot was written, the journals it folded in are still there
+    j, board = open_journal(tmp_path)
+    fill(j)
+    monkeypatch.setattr(j, "_write_snapshot",
+                        lambda items, generation: savefile.write_board(str(tmp_path / "save.uibb"), items, generation))
+    j.compact([(2, text("b2")), (3, text("c")), (1, text("a", 50))])
+    j.append(EDIT, 1, text("a2", 50))
+    j.tick()
+    j.compacting.join()
+    crash(j)
+    assert len(j.journals()) == 2
+    j, board = open_journal(tmp_path)
+    assert board == [(2, text("b2")), (3, text("c")), (1, text("a2", 50))]
+    assert [generation for generation, file in j.journals()] == [1]
+    j.close()
+
+def test_appends_while_compacting(tmp_path, monkeypatch):
+    # entries keep coming in while the snapshot is being written
+    writing, release = threading.Event(), threading.Event()
+    write_board = savefile.write_board
+    def slow_write_board(*args):
+        writing.set()
+        release.wait(5)
+        write_board(*args)
+    monkeypatch.setattr(journal_module.savefile, "write_board", slow_write_board)
+    j, board = open_journal(tmp_path)
+    fill(j)
+    j.compact([(2, text("b2")), (3, text("c")), (1, text("a", 50))])
+    assert writing.wait(5)
+    j.append(ADD, 4, text("d"), 3)
+    j.append(DELETE, 2)
+    j.tick()
+    release.set()
+    j.close()
+    j, board = open_journal(tmp_path)
+    assert board == [(3, text("c")), (4, text("d")), (1, text("a", 50))]
+    assert [generation for generation, file in j.journals()] == [1]
+    j.close()
+
+def test_partial_last_entry(tmp_path):
+    # a crash in the middle of writing an entry: it is dropped, and entries
+    # written afterwards aren't lost behind it
+    j, board = open_journal(tmp_path)
+    fill(j)
+    j.append(EDIT, 3, text("c2"))
+    j.tick()
+    crash(j)
+    file = tmp_path / "save.uibb.0.journal"
+    file.write_bytes(file.read_bytes()[:-5])
+    j, board = open_journal(tmp_path)
+    assert board == [(2, text("b2")), (3, text("c")), (1, text("a", 50))]
+    j.append(EDIT, 2, text("b3"))
+    j.tick()
+    crash(j)
+    j, board = open_journal(tmp_path)
+    assert board == [(2, text("b3")), (3, text("c")), (1, text("a", 50))]
+    j.close()
+
+def test_empty_journal(tmp_path):
+    # a crash right after the journal was created, before its header
+    (tmp_path / "save.uibb.0.journal").write_bytes(b"")
+    j, board = open_journal(tmp_path)
+    assert board == []
+    j.append(ADD, 1, text("a"))
+    j.close()
+    j, board = open_journal(tmp_path)
+    assert board == [(1, text("a"))]
+    j.close()
@@ -0,0 +1,75 @@
+import struct
+
+import pytest
+
+import savefile
+
+BOARD = [
+    (7, ("ChalkText", "héllo,, wörld\nline two", 10, -20, 22, 3)),
+    (3, ("ChalkLine", -5, 6, 700, 800, 6, 1)),
+    (12, ("App", "/home/user/notes.txt", 40, 50, 2, "notes")),
+    (1, ("ChalkStroke", 100, 200, (0, 0, 5, -3, 12, 9, -40, 31), 4, 5)),
+]
+
+def test_round_trip_every_kind(tmp_path):
+    file = str(tmp_path / "save.uibb")
+    savefile.write_board(file, BOARD, generation=4)
+    assert list(savefile.read_board(file)) == BOARD
+    assert savefile.board_generation(file) == 4
+
+def test_truncated_last_record_is_dropped(tmp_path):
+    file = tmp_path / "save.uibb"
+    savefile.write_board(str(file), BOARD)
+    data = file.read_bytes()
+    file.write_bytes(data[:-3])
+    assert list(savefile.read_board(str(file))) == BOARD[:-1]
+
+def test_corrupt_trailing_length_is_dropped(tmp_path):
+    # a length running past the end of the file (e.g. garbage appended)
+    file = tmp_path / "save.uibb"
+    savefile.write_board(str(file), BOARD)
+    file.write_bytes(file.read_bytes() + struct.pack("<I", 1 << 30) + b"junk")
+    assert list(savefile.read_board(str(file))) == BOARD
+
+def test_unknown_kind_is_skipped(tmp_path):
+    # a kind added by a newer version
+    file = tmp_path / "save.uibb"
+    body = bytes((99,)) + savefile.UID.pack(5) + b"future fields"
+    header = savefile.HEADER.pack(savefile.MAGIC, savefile.VERSION) + savefile.GENERATION.pack(0)
+    savefile.write_atomic(str(file), header, [savefile.encode(*BOARD[0]), body, savefile.encode(*BOARD[1])])
+    assert list(savefile.read_board(str(file))) == BOARD[:2]
+
+def test_version_1_records_are_numbered(tmp_path):
+    # no generation in the header and no uid in the records
+    file = tmp_path / "save.uibb"
+    bodies = [savefile.encode(uid, record) for uid, record in BOARD]
+    bodies = [body[:1] + body[1 + savefile.UID.size:] for body in bodies]
+    savefile.write_atomic(str(file), savefile.HEADER.pack(savefile.MAGIC, 1), bodies)
+    assert list(savefile.read_board(str(file))) == [(i, record) for i, (uid, record) in enumerate(BOARD)]
+
+def test_not_a_save_file(tmp_path):
+    file = tmp_path / "save.uibb"
+    file.write_bytes(b"ChalkText,,hi,,1,,2,,22,,3\n")
+    with pytest.raises(ValueError):
+        list(savefile.read_board(str(file)))
+
+def test_legacy_csv_migration(tmp_path):
+    legacy = tmp_path / "save.csv"
+    legacy.write_text("ChalkText,,a,,b,,10,,20,,22,,3\n"
+                      "ChalkLine,,1,,2,,3,,4,,6,,1\n"
+                      "App,,/home/user/notes.txt,,40,,50,,2,,notes\n"
+                      "not a record\n"
+                      "ChalkText,,half a line\n")
+    file = str(tmp_path / "save.uibb")
+    # no new save yet: the old one is read
+    board = list(savefile.load_board(file, str(legacy)))
+    assert board == [(0, ("ChalkText", "a,,b", 10, 20, 22, 3)),
+                     (1, ("ChalkLine", 1, 2, 3, 4, 6, 1)),
+                     (2, ("App", "/home/user/notes.txt", 40, 50, 2, "notes"))]
+    # once written in the new format, that one is read instead
+    savefile.write_board(file, board)
+    legacy.write_text("")
+    assert list(savefile.load_board(file, str(legacy))) == board
+
+def test_nothing_saved(tmp_path):
+    assert list(savefile.load_board(str(tmp_path / "save.uibb"), str(tmp_path / "save.csv"))) == []
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from searchservice import SearchService
+
+def test_search_first_result_latency(tmp_path, monkeypatch):
+    # Enter to first result, through the worker process, on a small local tree
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    tree = tmp_path / "tree"
+    (tree / "sub").mkdir(parents=True)
+    for name in ("notes.txt", "a.py", "sub/b.py", "sub/readme.md"):
+        (tree / name).write_text("")
+    service = SearchService(str(tmp_path / "index.db"), [str(tree)], [], history=10)
+    try:
+        query = service.search("*.py")
+        deadline = time.perf_counter() + 30
+        while query not in service.statuses and time.perf_counter() < deadline:
+            service.poll()
+            time.sleep(0.005)
+    finally:
+        service.close()
+    assert service.statuses[query].startswith("2 results")
+    assert len(service.latencies) == 1
+    stats = service.stats()
+    assert stats["search"]["count"] == 1
+    assert 0 < stats["search"]["p50_ms"] < 5000
+
+def test_history_is_capped():
+    # latencies and statuses only cover the last history queries
+    service = SearchService("unused.db", [], [], history=3)
+    for query in range(1, 6):
+        service.sent[query] = time.perf_counter()
+        service.inbox.put(("first_result", query))
+        service.inbox.put(("done", query, "1 results"))
+    service.poll()
+    assert len(service.latencies) == 3
+    assert list(service.statuses) == [3, 4, 5]
+    assert service.stats()["search"]["count"] == 3
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+
+from bb_items import ChalkText
+from viewport import View
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def screen(monkeypatch):
+    # fonts are found relative to the repository, like main.py
+    monkeypatch.chdir(ROOT)
+    pg.display.init()
+    pg.font.init()
+    yield pg.display.set_mode((400, 300))
+    pg.display.quit()
+
+@pytest.mark.parametrize("zoom", [0.7, 1.5])
+def test_empty_text_draws_zoomed(screen, zoom):
+    # a new ChalkText has no text yet, its surface is 0 px wide
+    view = View()
+    view.zoom = zoom
+    text = ChalkText("", 100, 100, 22, 0, True)
+    assert text.text_surface.get_width() == 0
+    text.draw(screen, view)
+
+@pytest.mark.parametrize("zoom", [0.7, 1.5])
+def test_empty_surface_is_not_scaled(screen, zoom):
+    view = View()
+    view.zoom = zoom
+    empty = pg.Surface((0, 29), pg.SRCALPHA)
+    assert view.image(empty) is empty
+    assert view.text(empty, lambda size: pg.Surface((0, size), pg.SRCALPHA), 22) is empty
@@ -0,0 +1,139 @@
+import pygame as pg
+from collections import OrderedDict
+import math
+
+from header import *
+
+class ScaleCache:
+    def __init__(self, budget):
+        # surfaces made for a zoom level, keyed by (surface, zoom), least
+        # recently used first, capped at budget bytes
+        self.budget = budget
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        # counters for cache hits/misses and surfaces dropped to stay in budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, make):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = make()
+        cost = surface.get_width() * surface.get_height() * surface.get_bytesize()
+        if cost > self.budget:
+            return surface
+        self.surfaces[key] = surface
+        self.bytes += cost
+        while self.bytes > self.budget:
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes": self.bytes, "size": len(self.surfaces)}
+
+
+class View:
+    def __init__(self):
+        # items live in world coordinates: x, y is the world point at the top
+        # left corner of the window and zoom (one of ZOOM_LEVELS) the window
+        # pixels per world unit; at zoom 1 world and window pixels line up
+        self.x, self.y = 0, 0
+        self.level = ZOOM_LEVELS.index(1)
+        self.zoom = 1
+        # text and icons made for the zoom levels in use
+        self.cache = ScaleCache(SCALE_CACHE_BYTES)
+
+    def to_world(self, pos):
+        # world point (whole units, like the items' positions) under a window pixel
+        return (math.floor(pos[0] / self.zoom + self.x), math.floor(pos[1] / self.zoom + self.y))
+
+    def to_screen(self, pos):
+        return (round((pos[0] - self.x) * self.zoom), round((pos[1] - self.y) * self.zoom))
+
+    def size(self, n):
+        # a world length on screen, at least a pixel
+        return max(1, round(n * self.zoom))
+
+    def rect_on_screen(self, rect):
+        # where a world rect is drawn (same rounding as to_screen)
+        left, top = self.to_screen(rect[:2])
+        right, bottom = self.to_screen((rect[0] + rect[2], rect[1] + rect[3]))
+        return pg.Rect(left, top, right - left, bottom - top)
+
+    def rect_to_screen(self, rect):
+        # window pixels that anything drawn inside a world rect can touch
+        z = self.zoom
+        left = math.floor((rect[0] - self.x) * z) - 1
+        top = math.floor((rect[1] - self.y) * z) - 1
+        right = math.ceil((rect[0] + rect[2] - self.x) * z) + 1
+        bottom = math.ceil((rect[1] + rect[3] - self.y) * z) + 1
+        return pg.Rect(left, top, right - left, bottom - top)
+
+    def rect_to_world(self, rect):
+        # world area shown by a rect of window pixels
+        z = self.zoom
+        left = math.floor(rect[0] / z + self.x) - 1
+        top = math.floor(rect[1] / z + self.y) - 1
+        right = math.ceil((rect[0] + rect[2]) / z + self.x) + 1
+        bottom = math.ceil((rect[1] + rect[3]) / z + self.y) + 1
+        return pg.Rect(left, top, right - left, bottom - top)
+
+    def event(self, event):
+        # the event as seen by the items (positions in world coordinates)
+        if not hasattr(event, "pos"):
+            return event
+        attrs = dict(event.dict)
+        attrs["pos"] = self.to_world(event.pos)
+        return pg.event.Event(event.type, attrs)
+
+    def pan(self, dx, dy):
+        # move the board by (dx, dy) window pixels
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def zoom_at(self, pos, steps):
+        # go steps zoom levels in (out if negative), keeping the world point
+        # under window pixel pos in place; returns whether the zoom changed
+        level = min(max(self.level + steps, 0), len(ZOOM_LEVELS) - 1)
+        if level == self.level:
+            return False
+        world_x, world_y = pos[0] / self.zoom + self.x, pos[1] / self.zoom + self.y
+        self.level = level
+        self.zoom = ZOOM_LEVELS[level]
+        self.x, self.y = world_x - pos[0] / self.zoom, world_y - pos[1] / self.zoom
+        # back at zoom 1, keep world and window pixels lined up
+        if self.zoom == 1:
+            self.x, self.y = round(self.x), round(self.y)
+        return True
+
+    def image(self, surface):
+        # surface (an icon, a label) scaled for the zoom; empty ones (e.g. the
+        # text of a new ChalkText) as they are, smoothscale can't take them
+        if self.zoom == 1 or not surface.get_width() or not surface.get_height():
+            return surface
+        size = (self.size(surface.get_width()), self.size(surface.get_height()))
+        return self.cache.get((surface, self.zoom), lambda: pg.transform.smoothscale(surface, size))
+
+    def text(self, surface, render, fontsize):
+        # surface is text rendered at fontsize by render(fontsize): zoomed
+        # out it is scaled down, zoomed in it is rendered again at the bigger
+        # size (so it stays sharp) and fitted to the same box
+        if self.zoom < 1:
+            return self.image(surface)
+        if self.zoom == 1 or not surface.get_width() or not surface.get_height():
+            return surface
+        def make():
+            size = (self.size(surface.get_width()), self.size(surface.get_height()))
+            text = render(self.size(fontsize))
+            if text.get_size() != size:
+                text = pg.transform.smoothscale(text, size)
+            return text
+        return self.cache.get((surface, self.zoom), make)
@@ -0,0 +1,29 @@
+import pygame as pg
+import time
+
+# posted by background work (icon loads, the search worker) once it has
+# something for the main loop, so a loop blocked waiting for events wakes up
+# to hand it over (see BlackBoard.poll)
+WAKEUP = pg.event.custom_type()
+
+def wake():
+    # safe to call from any thread; the event carries when it was sent, for
+    # the wakeup latency
+    try:
+        pg.event.post(pg.event.Event(WAKEUP, sent=time.perf_counter()))
+    except pg.error:
+        # no event queue (pygame not initialized, or shut down already)
+        pass
+
+def wait_events(timeout):
+    # block until an event comes in or timeout seconds passed (for good if
+    # None), then take every event waiting
+    if timeout is None:
+        first = pg.event.wait()
+    elif timeout > 0:
+        first = pg.event.wait(max(1, int(timeout * 1000)))
+    else:
+        return pg.event.get()
+    if first.type == pg.NOEVENT:
+        return pg.event.get()
+    return [first] + pg.event.get()
@@ -0,0 +1,115 @@
+from queue import Queue
+from threading import Lock, Thread, Event
+import os, time
+
+from fileindex import matcher
+
+class ParallelWalker:
+    def __init__(self, roots, pattern, excluded=None, workers=8, limit=None, batch=200, interval=0.1):
+        # walks roots breadth-first with a pool of threads (os.scandir releases
+        # the GIL while listing, so directories on different subtrees are read
+        # in parallel), matching every entry against pattern like rglob does
+        self.roots = roots
+        self.match = matcher(pattern)
+        self.excluded = excluded
+        self.workers = workers
+        self.limit = limit
+        # matches are handed out in batches of up to batch paths, at least every interval seconds
+        self.batch = batch
+        self.interval = interval
+        # directories waiting to be listed (None stops a worker) and how many
+        # are queued or being listed, the walk is over when that reaches 0
+        self.dirs = Queue()
+        self.pending = 0
+        self.lock = Lock()
+        # statistics, readable while the walk runs
+        self.scanned = 0
+        self.found = 0
+        self.start_time = None
+        self.end_time = None
+        self.limited = False
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def rate(self):
+        # entries scanned per second
+        elapsed = self.elapsed()
+        return self.scanned / elapsed if elapsed > 0 else 0.0
+
+    def run(self, emit, cancel=None):
+        # walk until done, cancelled (cancel is set) or limit matches were found,
+        # calling emit(list of paths) from the walking threads along the way
+        self.emit = emit
+        self.cancel = cancel if cancel is not None else Event()
+        self.out = []
+        # the first matches are handed out as soon as they are found
+        self.start_time = time.perf_counter()
+        self.last_emit = self.start_time - self.interval
+        self.pending = len(self.roots)
+        for root in self.roots:
+            self.dirs.put(root)
+        threads = [Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self.lock:
+            self._flush()
+        self.end_time = time.perf_counter()
+
+    def _work(self):
+        while True:
+            path = self.dirs.get()
+            if path is None:
+                return
+            subdirs = [] if self.cancel.is_set() else self._scan(path)
+            with self.lock:
+                self.pending += len(subdirs) - 1
+                for sub in subdirs:
+                    self.dirs.put(sub)
+                if self.pending == 0:
+                    for _ in range(self.workers):
+                        self.dirs.put(None)
+
+    def _scan(self, path):
+        # list one directory, returns its subdirectories to walk next
+        subdirs, hits, scanned = [], [], 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    scanned += 1
+                    if self.excluded is not None and self.excluded(entry.path, entry.name):
+                        continue
+                    if self.match(entry.path, entry.name):
+                        hits.append(entry.path)
+                    # like rglob, symlinked directories are listed but not descended
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        with self.lock:
+            self.scanned += scanned
+            if hits:
+                if self.limit is not None and self.found + len(hits) >= self.limit:
+                    hits = hits[:self.limit - self.found]
+                    self.limited = True
+                    self.cancel.set()
+                self.found += len(hits)
+                self.out.extend(hits)
+            now = time.perf_counter()
+            if len(self.out) >= self.batch or (self.out and now - self.last_emit >= self.interval):
+                self._flush()
+        return subdirs
+
+    def _flush(self):
+        # hand the matches found so far to emit, called with the lock held
+        self.last_emit = time.perf_counter()
+        if self.out:
+            out, self.out = self.out, []
+            self.emit(out)
@@ -1,27 +1,53 @@
 import pygame as pg
-from PyQt5.QtWidgets import QApplication, QDialog, QListWidget, QVBoxLayout
-from pathlib import Path
-from threading import Thread
-import sys, os
+import os, time
 
 from header import *
+from fonts import get_font, render_text
+from searchservice import SearchService
+from utils import launch
+from wakeup import wake
 
 class SearchBar:
     def __init__(self, x, y, text):
         # color, font, text, and various variables for this searchbar
         self.color = pg.Color(*COLOR_PAL[WHITE])
-        self.font = pg.font.Font(CHALK_FONT, CHALK_FONTSIZE)
         self.default_text = text
         self.text = text
         self.active = False
-        self.results = []
+        # search worker process holding the file index and the results window,
+        # started (and its index refreshed) when the search bar is activated
+        self.service = SearchService(SEARCH_INDEX_FILE, SEARCH_ROOTS, SEARCH_EXCLUDES, wake, SEARCH_HISTORY)
+        # inline dropdown of the best fuzzy matches while typing: the query goes
+        # out once typing pauses for SEARCH_DEBOUNCE seconds, rows are rendered
+        # when the matches arrive, selected is the highlighted row (-1 for none)
+        self.suggestions = []
+        self.rows = []
+        self.selected = -1
+        self.query_due = None
+        # paths pinned from the dropdown, handed out with the search results,
+        # and whether the click that pinned one is still held down
+        self.pinned = []
+        self.pressed = False
+        # class variables for damage tracking (area covered when last drawn)
+        self.dirty = True
+        self.drawn_rect = None
         # a text surface and a rectangle hitbox makes up a search bar
-        self.text_surface = self.font.render(text, True, self.color)
+        self.text_surface = render_text(CHALK_FONT, CHALK_FONTSIZE, text, self.color)
         self.rect = pg.Rect(x, y, self.text_surface.get_width() + 10, CHALK_FONTSIZE + 5)
     
     def handle_event(self, event):
         interacted = False
-        if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+        # hovering over the dropdown highlights a row, clicking pins it
+        if event.type == pg.MOUSEMOTION and self.over_dropdown(event.pos):
+            self.select(self.row_at(event.pos))
+        elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1 and self.over_dropdown(event.pos):
+            interacted = True
+            self.pressed = True
+            self.pin(self.suggestions[self.row_at(event.pos)])
+        elif event.type == pg.MOUSEBUTTONUP and event.button == 1 and self.pressed:
+            interacted = True
+            self.pressed = False
+        elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
             # click on search bar to activate it
             if self.rect.collidepoint(event.pos):
                 interacted = True
@@ -29,18 +55,33 @@ class SearchBar:
             else:
                 self.active = False
             # re-render the text for the search bar
-            self.text = '' if self.active else self.default_text
-            self.text_surface = self.font.render(self.text, True, self.color)
+            text = '' if self.active else self.default_text
+            if text != self.text:
+                self.dirty = True
+            self.text = text
+            if self.active:
+                self.service.refresh()
+            else:
+                self.clear_suggestions()
+            self.text_surface = render_text(CHALK_FONT, CHALK_FONTSIZE, self.text, self.color)
         # keyboard input when active
         elif self.active and event.type == pg.KEYDOWN:
             interacted = True
-            # {ENTER} searches
-            if event.key == pg.K_RETURN:
-                Thread(target=self._search, args=(self.text,), daemon=True).start()
+            text = self.text
+            # {DOWN}/{UP} move through the dropdown
+            if event.key in (pg.K_DOWN, pg.K_UP):
+                step = 1 if event.key == pg.K_DOWN else -1
+                self.select(max(-1, min(len(self.suggestions) - 1, self.selected + step)))
+                return interacted
+            # {ENTER} pins the highlighted row, or searches
+            elif event.key == pg.K_RETURN:
+                if self.selected >= 0:
+                    self.pin(self.suggestions[self.selected])
+                    return interacted
+                self.service.search(self.text)
             # {BACKSPACE} removes 1 char, , or 1 word if {CTRL} is held down
             elif event.key == pg.K_BACKSPACE:
-                keystates = pg.key.get_pressed()
-                if keystates[pg.K_LCTRL]:
+                if event.mod & pg.KMOD_LCTRL:
                     i = self.text.rstrip().rfind(" ")
                     self.text = self.text[:i+1] if i >= 0 else ''
                 else:
@@ -56,62 +97,137 @@ class SearchBar:
             else:
                 self.text += event.unicode
             # render new text
-            self.text_surface = self.font.render(self.text, True, self.color)
+            self.text_surface = render_text(CHALK_FONT, CHALK_FONTSIZE, self.text, self.color)
+            self.dirty = True
+            if self.text != text:
+                self.typed()
         return interacted
 
-    def _search(self, file):
-        # internal method for searching: uses SearchGUI to display search results
-        q = QApplication(sys.argv)
-        window = SearchGUI(self.results)
-        Thread(target=window.searchItems, args=(file,), daemon=True).start()
-        window.show()
-        q.exec_()
+    def typed(self):
+        # the text changed: query it once typing pauses, too short clears the dropdown
+        if len(self.text.strip()) < SEARCH_SUGGEST_MIN or not self.active:
+            self.query_due = None
+            self.service.drop_suggestions()
+            self.clear_suggestions()
+        else:
+            self.query_due = time.perf_counter() + SEARCH_DEBOUNCE
+
+    def poll(self):
+        # called every frame: send the query once typing paused, show the newest matches
+        if self.query_due is not None and time.perf_counter() >= self.query_due:
+            self.query_due = None
+            self.service.suggest(self.text.strip())
+        self.service.poll()
+        suggestions = self.service.take_suggestions()
+        if suggestions is not None and self.active:
+            self.set_suggestions(suggestions)
+
+    def due(self):
+        # seconds until poll() has a query to send, None if there is none
+        if self.query_due is None:
+            return None
+        return max(0.0, self.query_due - time.perf_counter())
+
+    def set_suggestions(self, paths):
+        # render a row per path: its name, then its folder shortened to fit
+        font = get_font(OPTMENU_FONT, OPTMENU_FONTSIZE)
+        self.suggestions = paths
+        self.rows = []
+        for path in paths:
+            folder, name = os.path.split(path)
+            name_surface = render_text(OPTMENU_FONT, OPTMENU_FONTSIZE, name, OPTMENU_TEXT_COLOR)
+            room = SEARCH_DROPDOWN_WIDTH - name_surface.get_width() - 20
+            while len(folder) > 3 and font.size("  " + folder)[0] > room:
+                folder = "..." + folder[4:] if folder.startswith("...") else "..." + folder[1:]
+            folder_surface = render_text(OPTMENU_FONT, OPTMENU_FONTSIZE, "  " + folder, SEARCH_DROPDOWN_DIR_COLOR)
+            self.rows.append((name_surface, folder_surface))
+        self.selected = -1
+        self.dirty = True
+
+    def clear_suggestions(self):
+        if self.suggestions:
+            self.set_suggestions([])
+
+    def select(self, row):
+        if row != self.selected:
+            self.selected = row
+            self.dirty = True
+
+    def pin(self, path):
+        # hand the path to the board (pinned as an App) and reset the search bar
+        self.pinned.append(path)
+        self.active = False
+        self.text = self.default_text
+        self.text_surface = render_text(CHALK_FONT, CHALK_FONTSIZE, self.text, self.color)
+        self.query_due = None
+        self.service.drop_suggestions()
+        self.clear_suggestions()
+        self.dirty = True
+
+    def dropdown_rect(self):
+        # rows stack up from the search bar (down from it if there is no room above)
+        h = (OPTMENU_FONTSIZE + 10) * len(self.rows)
+        y = self.rect.y - h if self.rect.y >= h else self.rect.bottom
+        return pg.Rect(self.rect.x, y, SEARCH_DROPDOWN_WIDTH, h)
+
+    def row_at(self, pos):
+        return (pos[1] - self.dropdown_rect().y) // (OPTMENU_FONTSIZE + 10)
+
+    def over_dropdown(self, pos):
+        return bool(self.rows) and self.dropdown_rect().collidepoint(pos)
+
+    def covers(self, pos):
+        # whether clicks at pos are the search bar's: the dropdown is over pos,
+        # or a click on it is still held (the items under it don't get those)
+        return self.pressed or self.over_dropdown(pos)
 
     def get_search_results(self):
-        # extract search results out
-        if len(self.results) == 0:
-            return self.results
-        else:
-            temp = self.results
-            self.results = []
-            return temp
+        # paths pinned from the dropdown or picked in the results window since the last call
+        picks = self.pinned + self.service.picks()
+        self.pinned = []
+        return picks
     
     def move(self, x, y):
         self.rect = pg.Rect(x, y, self.text_surface.get_width() + 10, CHALK_FONTSIZE + 5)
+        self.dirty = True
     
     def update(self):
         # update the rectangle hitbox wrt the current text size
         self.rect.w = self.text_surface.get_width() + 10
 
+    def get_bounds(self):
+        # area covered by the text (surface) and the dropdown
+        bounds = self.text_surface.get_rect(topleft=(self.rect.x+5, self.rect.y+5))
+        if self.rows:
+            bounds = bounds.union(self.dropdown_rect())
+        return bounds
+
     def draw(self, screen):
         # draw the text (surface), rectangle hitbox is not drawn
         screen.blit(self.text_surface, (self.rect.x+5, self.rect.y+5))
 
+    def draw_dropdown(self, screen):
+        # drawn over the items, after them
+        rect = self.dropdown_rect()
+        h = OPTMENU_FONTSIZE + 10
+        for i, (name_surface, folder_surface) in enumerate(self.rows):
+            row = pg.Rect(rect.x, rect.y + i*h, rect.w, h)
+            screen.fill(OPTMENU_COLOR_HOVERED if i == self.selected else OPTMENU_COLOR, row)
+            screen.blit(name_surface, (row.x + 5, row.y + 2))
+            screen.blit(folder_surface, (row.x + 5 + name_surface.get_width(), row.y + 2))
+
+
+# option labels look the same on every item, so each (label, color) is
+# rendered once per process and never evicted
+menu_labels = {}
 
-class SearchGUI(QDialog):
-    def __init__(self, results):
-        # QDialog widget
-        super(SearchGUI, self).__init__()
-        self.setStyleSheet("background-color: rgb(30, 30, 30);")
-        self.results = results
-        # contains a list widget to display the search results
-        self.list_widget = QListWidget()
-        self.list_widget.setStyleSheet("color: rgb(211, 211, 211);")
-        self.list_widget.setFixedHeight(600)
-        self.list_widget.setMinimumWidth(400)
-        self.list_widget.itemDoubleClicked.connect(self.addAndReturn)
-        # list widget sits on top of layout
-        layout = QVBoxLayout(self)
-        layout.addWidget(self.list_widget)
-
-    def searchItems(self, file):
-        for path in Path('/').rglob(file):
-            self.list_widget.addItem(str(path))
-
-    def addAndReturn(self, item):
-        # quits GUI after picking
-        self.results.append(item.text())
-        QApplication.quit()
+def menu_label(text, color):
+    key = (text, tuple(pg.Color(color)))
+    label = menu_labels.get(key)
+    if label is None:
+        label = get_font(OPTMENU_FONT, OPTMENU_FONTSIZE).render(text, True, color)
+        menu_labels[key] = label
+    return label
 
 
 class OptionsMenu():
@@ -127,6 +243,10 @@ class OptionsMenu():
         for i in range(len(self.options)):
             self.opt_rects[i].x, self.opt_rects[i].y = x, y + i*h
 
+    def get_bounds(self):
+        # area covered by all the option rectangles
+        return self.opt_rects[0].unionall(self.opt_rects[1:])
+
     def handle_event(self, event):
         # pressing any key closes the option menu
         if event.type == pg.KEYDOWN:
@@ -139,27 +259,24 @@ class OptionsMenu():
                 else:
                     self.rect_colors[i] = OPTMENU_COLOR
 
-    def draw(self, screen):
+    def draw(self, screen, view):
+        # the menu sits on the board next to its item, so it is zoomed along
         # draw the background of the options menu
         for i in range(len(self.opt_rects)):
-            pg.Surface.fill(screen, self.rect_colors[i], self.opt_rects[i])
+            pg.Surface.fill(screen, self.rect_colors[i], view.rect_on_screen(self.opt_rects[i]))
         # draw in the indivdual options
         for i in range(len(self.options)):
-            screen.blit(self.options[i], (self.opt_rects[i].x + 2, self.opt_rects[i].y + 2))
+            screen.blit(view.image(self.options[i]), view.to_screen((self.opt_rects[i].x + 2, self.opt_rects[i].y + 2)))
 
 
 class AppOptionsMenu(OptionsMenu):
     def __init__(self, app):
         super().__init__(app)
         # 4 options: launch, remove, rename, color
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Launch", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Remove", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Rename", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, pg.Color(*COLOR_PAL[self.p.color_idx])))
+        self.options.append(menu_label("Launch", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Remove", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Rename", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Color >>", pg.Color(*COLOR_PAL[self.p.color_idx])))
         # rectangles for the options
         w = self.options[3].get_width() + 10
         h = OPTMENU_FONTSIZE + 10
@@ -175,7 +292,7 @@ class AppOptionsMenu(OptionsMenu):
         if event.type == pg.MOUSEBUTTONUP and event.button == 1:
             # click on launch option
             if self.opt_rects[0].collidepoint(event.pos):
-                os.startfile(self.p.path)
+                launch(self.p.path)
                 self.p.options_opened = False
             # click on remove option
             if self.opt_rects[1].collidepoint(event.pos):
@@ -185,35 +302,31 @@ class AppOptionsMenu(OptionsMenu):
             elif self.opt_rects[2].collidepoint(event.pos):
                 self.p.text_color = pg.Color(*EDITING_COLOR)
                 self.p.renaming = True
-                self.p.text_surface = self.p.font.render(self.p.name, True, self.p.text_color)
+                self.p.text_surface = render_text(APP_FONT, APP_FONTSIZE, self.p.name, self.p.text_color)
                 self.p.options_opened = False
             # click on color >>
             elif self.opt_rects[3].collidepoint(event.pos):
                 self.p.color_idx = (self.p.color_idx + 1) % NUM_COLORS
                 self.p.text_color = pg.Color(*COLOR_PAL[self.p.color_idx])
-                self.options[3] = pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, self.p.text_color)
-                self.p.text_surface = self.p.font.render(self.p.name, True, self.p.text_color)
+                self.options[3] = menu_label("Color >>", self.p.text_color)
+                self.p.text_surface = render_text(APP_FONT, APP_FONTSIZE, self.p.name, self.p.text_color)
             # clicking anywhere else closes this options menu
             else:
                 self.p.options_opened = False
         super().handle_event(event)
 
-    def draw(self, screen):
-        super().draw(screen)
+    def draw(self, screen, view):
+        super().draw(screen, view)
 
 
 class ChalkTextOptionsMenu(OptionsMenu):
     def __init__(self, chalkText):
         super().__init__(chalkText)
         # 4 options: erase, edit, color, size
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Erase", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Edit", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, pg.Color(*COLOR_PAL[self.p.color_idx])))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("- Size +", True, OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Erase", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Edit", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Color >>", pg.Color(*COLOR_PAL[self.p.color_idx])))
+        self.options.append(menu_label("- Size +", OPTMENU_TEXT_COLOR))
         # rectangles for the options
         w = self.options[2].get_width() + 10
         h = OPTMENU_FONTSIZE + 10
@@ -242,46 +355,38 @@ class ChalkTextOptionsMenu(OptionsMenu):
             elif self.opt_rects[1].collidepoint(event.pos):
                 self.p.active = True
                 self.p.color = pg.Color(*EDITING_COLOR)
-                self.p.text_surface = self.p.font.render(self.p.text, True, self.p.color)
                 self.p.options_opened = False
             # click on color >>
             elif self.opt_rects[2].collidepoint(event.pos):
                 self.p.color_idx = (self.p.color_idx + 1) % NUM_COLORS
                 self.p.color = pg.Color(*COLOR_PAL[self.p.color_idx])
-                self.options[2] = pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, self.p.color)
-                self.p.text_surface = self.p.font.render(self.p.text, True, self.p.color)                
+                self.options[2] = menu_label("Color >>", self.p.color)
             # click on size -
             elif self.opt_rects[3].collidepoint(event.pos):
                 if self.p.fontsize > 2:
                     self.p.fontsize -= 2
-                    self.p.font = pg.font.Font(CHALK_FONT, self.p.fontsize)
-                    self.p.text_surface = self.p.font.render(self.p.text, True, self.p.color)
+                    self.p.measure()
             # click on size +
             elif self.opt_rects[4].collidepoint(event.pos):
                 self.p.fontsize += 2
-                self.p.font = pg.font.Font(CHALK_FONT, self.p.fontsize)
-                self.p.text_surface = self.p.font.render(self.p.text, True, self.p.color)
+                self.p.measure()
             # clicking anywhere else closes this options menu
             else:
                 self.p.options_opened = False
         super().handle_event(event)
 
-    def draw(self, screen):
-        super().draw(screen)
+    def draw(self, screen, view):
+        super().draw(screen, view)
 
 
 class ChalkLineOptionsMenu(OptionsMenu):
     def __init__(self, chalkLine):
         super().__init__(chalkLine)
         # 4 options: erase, adjust, color, size
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Erase", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Adjust", True, OPTMENU_TEXT_COLOR))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, pg.Color(*COLOR_PAL[self.p.color_idx])))
-        self.options.append(
-            pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("- Size +", True, OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Erase", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Adjust", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Color >>", pg.Color(*COLOR_PAL[self.p.color_idx])))
+        self.options.append(menu_label("- Size +", OPTMENU_TEXT_COLOR))
         # rectangles for the options
         w = self.options[2].get_width() + 10
         h = OPTMENU_FONTSIZE + 10
@@ -309,13 +414,11 @@ class ChalkLineOptionsMenu(OptionsMenu):
             # click on adjust option
             elif self.opt_rects[1].collidepoint(event.pos):
                 self.p.drawn = False
-                self.p.color = pg.Color(*EDITING_COLOR)
                 self.p.options_opened = False
             # click on color >>
             elif self.opt_rects[2].collidepoint(event.pos):
                 self.p.color_idx = (self.p.color_idx + 1) % NUM_COLORS
-                self.p.color = pg.Color(*COLOR_PAL[self.p.color_idx])
-                self.options[2] = pg.font.Font(OPTMENU_FONT, OPTMENU_FONTSIZE).render("Color >>", True, self.p.color)
+                self.options[2] = menu_label("Color >>", self.p.color)
             # click on size -
             elif self.opt_rects[3].collidepoint(event.pos):
                 if self.p.width > 1:
@@ -328,5 +431,56 @@ class ChalkLineOptionsMenu(OptionsMenu):
                 self.p.options_opened = False
         super().handle_event(event)
 
-    def draw(self, screen):
-        super().draw(screen)
+    def draw(self, screen, view):
+        super().draw(screen, view)
+
+
+class ChalkStrokeOptionsMenu(OptionsMenu):
+    def __init__(self, chalkStroke):
+        super().__init__(chalkStroke)
+        # 3 options: erase, color, size
+        self.options.append(menu_label("Erase", OPTMENU_TEXT_COLOR))
+        self.options.append(menu_label("Color >>", pg.Color(*COLOR_PAL[self.p.color_idx])))
+        self.options.append(menu_label("- Size +", OPTMENU_TEXT_COLOR))
+        # rectangles for the options
+        w = self.options[1].get_width() + 10
+        h = OPTMENU_FONTSIZE + 10
+        for i in range(len(self.options)):
+            self.opt_rects.append(pg.Rect(0, 0, w, h))
+        # special setup for size option
+        self.opt_rects[-1].width = w//2
+        self.opt_rects.append(pg.Rect(0, 0, w//2, h))
+        self.w = w
+        # color of option rectangles (changes when hovered)
+        self.rect_colors = [OPTMENU_COLOR] * len(self.opt_rects)
+
+    def setpos(self, x, y):
+        super().setpos(x, y)
+        # special setup for size option
+        x, y = self.opt_rects[-2].x + self.w//2, self.opt_rects[-2].y
+        self.opt_rects[-1].x, self.opt_rects[-1].y = x, y
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEBUTTONUP and event.button == 1:
+            # click on erase option
+            if self.opt_rects[0].collidepoint(event.pos):
+                self.p.keep = False
+                self.p.options_opened = False
+            # click on color >>
+            elif self.opt_rects[1].collidepoint(event.pos):
+                self.p.color_idx = (self.p.color_idx + 1) % NUM_COLORS
+                self.options[1] = menu_label("Color >>", self.p.color)
+            # click on size -
+            elif self.opt_rects[2].collidepoint(event.pos):
+                if self.p.width > 1:
+                    self.p.width -= 1
+            # click on size +
+            elif self.opt_rects[3].collidepoint(event.pos):
+                self.p.width += 1
+            # clicking anywhere else closes this options menu
+            else:
+                self.p.options_opened = False
+        super().handle_event(event)
+
+    def draw(self, screen, view):
+        super().draw(screen, view)